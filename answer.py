@@ -1,151 +1,276 @@
 import os
 import json
+import bisect
+import collections
+import functools
 import re
-import importlib
 import sys
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # 从配置文件导入所有配置
 import config
+from my_utils.runner import get_model_instance
 
-def get_model_instance():
-    """动态导入并实例化所选的模型。"""
+def iter_quizzes(quizzes_path):
+    """
+    逐条读取Quizzes.json中的题目；安装了 ijson 时流式解析，避免一次性载入整个文件。
+    解析出错时打印错误后重新抛出，不会以部分题目继续评估并报告准确率。
+    """
     try:
-        model_name = config.SELECTED_MODEL
-        model_config = config.MODEL_CONFIGS[model_name]
-        
-        # 动态地从 models 包中导入对应的模块
-        module_name = model_config['module_name']
-        model_module = importlib.import_module(module_name)
-        
-        # 从模块中获取模型类
-        ModelClass = getattr(model_module, model_name)
-        
-        # 实例化模型
-        print(f"正在实例化模型: {model_name}")
-        instance = ModelClass(
-            device=config.DEVICE,
-            **model_config
-        )
-        return instance
-
-    except (ImportError, KeyError, AttributeError) as e:
-        print(f"错误: 无法加载模型 '{config.SELECTED_MODEL}'。请检查 'config.py' 和 'models' 文件夹。")
-        print(f"详细错误: {e}")
-        return None
+        import ijson
+    except ImportError:
+        ijson = None
+    
+    try:
+        with open(quizzes_path, 'rb') as f:
+            if ijson is not None:
+                yield from ijson.items(f, 'item')
+            else:
+                yield from json.load(f)
+    except Exception as e:
+        print(f"错误: 加载Quizzes.json失败: {e}")
+        raise
 
 def load_quizzes(quizzes_path):
-    """加载Quizzes.json文件"""
+    """加载Quizzes.json文件，返回题目的迭代器；文件不存在时返回 None"""
     if not os.path.exists(quizzes_path):
         print(f"错误: Quizzes.json文件未找到 at {quizzes_path}")
         return None
     
-    try:
-        with open(quizzes_path, 'r', encoding='utf-8') as f:
-            quizzes = json.load(f)
-        return quizzes
-    except Exception as e:
-        print(f"错误: 加载Quizzes.json失败: {e}")
-        return None
+    return iter_quizzes(quizzes_path)
+
+AUDIO_EXTENSIONS = ['.wav', '.mp3', '.flac', '.m4a']
+
+# 句子长度类别及其在统计数组中的行号
+CATEGORIES = ('short', 'medium', 'long')
+_CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+# 统计数组的列：句子数量、问题数量、正确回答数量
+_SENTENCES, _TOTAL, _CORRECT = 0, 1, 2
+
+def build_audio_index(audio_base_path):
+    """
+    用一次 os.scandir 扫描音频目录，建立音频文件索引。
+
+    Returns:
+        (by_stem, names, paths): by_stem 为 文件名(去扩展名) -> 路径（同名时取扩展名优先级最高者）；
+        names/paths 为按文件名排序的平行列表，用于按句子ID前缀二分查找。
+    """
+    by_stem = {}
+    entries = []
+    with os.scandir(audio_base_path) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if ext not in AUDIO_EXTENSIONS or not entry.is_file():
+                continue
+            entries.append((entry.name, entry.path))
+            current = by_stem.get(stem)
+            if current is None or AUDIO_EXTENSIONS.index(ext) < AUDIO_EXTENSIONS.index(os.path.splitext(current)[1]):
+                by_stem[stem] = entry.path
+    entries.sort()
+    names = [name for name, _ in entries]
+    paths = [path for _, path in entries]
+    return by_stem, names, paths
 
-def find_audio_file(sentence_id, audio_base_path):
-    """根据句子ID查找对应的音频文件"""
-    # 尝试不同的音频文件扩展名
-    extensions = ['.wav', '.mp3', '.flac', '.m4a']
+def find_audio_file(sentence_id, audio_index):
+    """根据句子ID在预先建立的索引中查找对应的音频文件"""
+    by_stem, names, paths = audio_index
     
-    for ext in extensions:
-        audio_path = os.path.join(audio_base_path, f"dialect_{sentence_id}{ext}")
-        if os.path.exists(audio_path):
-            return audio_path
+    # 优先匹配 dialect_<id>.<ext> 命名
+    audio_path = by_stem.get(f"dialect_{sentence_id}")
+    if audio_path:
+        return audio_path
     
-    # 如果没找到，尝试查找其他可能的命名模式
-    for ext in extensions:
-        # 尝试查找以句子ID开头的文件
-        for file in os.listdir(audio_base_path):
-            if file.startswith(sentence_id) and file.endswith(ext):
-                return os.path.join(audio_base_path, file)
+    # 如果没找到，尝试查找以句子ID开头的文件：排序后这些文件名是连续的一段
+    start = bisect.bisect_left(names, sentence_id)
+    end = start
+    while end < len(names) and names[end].startswith(sentence_id):
+        end += 1
+    for ext in AUDIO_EXTENSIONS:
+        for i in range(start, end):
+            if names[i].endswith(ext):
+                return paths[i]
     
     return None
 
-def run_quizzes_evaluation(model, quizzes, audio_base_path):
+def get_sentence_category(sentence):
+    """根据句子长度确定类别"""
+    sentence_length = len(sentence)
+    if sentence_length < 30:
+        return 'short'
+    elif sentence_length < 100:
+        return 'medium'
+    else:
+        return 'long'
+
+def prepare_quizzes(quizzes, audio_base_path):
+    """
+    预处理测验题目：确定句子类别并解析音频路径，过滤掉找不到音频的句子。
+
+    Returns:
+        (prepared, sentence_counts): prepared 为 (quiz, category, audio_path) 列表；
+        sentence_counts 为各类别的句子数量（包含未找到音频的句子）。
+    """
+    # 一次性建立音频文件索引，避免每个句子重复列目录
+    audio_index = build_audio_index(audio_base_path)
+    
+    prepared = []
+    sentence_counts = {category: 0 for category in CATEGORIES}
+    for quiz in quizzes:
+        sentence_id = quiz.get("sentence_id", "未知")
+        category = get_sentence_category(quiz.get("sentence", ""))
+        sentence_counts[category] += 1
+        
+        # 查找对应的音频文件
+        audio_path = find_audio_file(sentence_id, audio_index)
+        if not audio_path:
+            print(f"警告: 未找到句子 {sentence_id} 的音频文件")
+            continue
+        prepared.append((quiz, category, audio_path))
+    
+    return prepared, sentence_counts
+
+def answer_quiz(model, quiz, audio_path, use_dialect_explanations=False):
+    """
+    将同一句子的所有问题一次性交给模型，使音频只需读取/编码一次。
+    answer_batch 出错时改为逐题调用 answer，单个问题出错时该位置为对应的异常，不影响同一句子的其他问题。
+    """
+    questions = quiz.get("quiz_data", {}).get("questions", [])
+    question_texts = [question_data.get("question", "") for question_data in questions]
+    options_list = [question_data.get("options", []) for question_data in questions]
+    dialect_explanations = quiz.get("dialect_explanations", None)  # 获取 dialect_explanations 参数
+    kwargs = {"dialect_explanations": dialect_explanations} if use_dialect_explanations and dialect_explanations else {}
+    
+    try:
+        return model.answer_batch(audio_path, question_texts, options_list, **kwargs)
+    except Exception as e:
+        print(f"批量回答出错，改为逐题回答: {e}")
+    
+    model_answers = []
+    for question, options in zip(question_texts, options_list):
+        try:
+            model_answers.append(model.answer(audio_path, question, options, **kwargs))
+        except Exception as e:
+            model_answers.append(e)
+    return model_answers
+
+def iter_quiz_answers(model, prepared_quizzes, use_dialect_explanations=False, concurrency=1):
+    """
+    按原顺序产出 ((quiz, category, audio_path), get_answers)，调用 get_answers() 得到该句子的答案列表。
+
+    concurrency > 1 时用线程池提前提交之后的句子（远程 API 模型是 IO 密集型），
+    同时最多只有 2 * concurrency 个句子在途；提前退出时取消尚未开始的请求。
+    concurrency <= 1 时 get_answers 才调用模型，模型内部的输出位于句子信息之后。
+    """
+    if concurrency <= 1:
+        for entry in prepared_quizzes:
+            quiz, _, audio_path = entry
+            yield entry, functools.partial(answer_quiz, model, quiz, audio_path, use_dialect_explanations)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = collections.deque()
+    try:
+        for entry in prepared_quizzes:
+            quiz, _, audio_path = entry
+            pending.append((entry, executor.submit(answer_quiz, model, quiz, audio_path, use_dialect_explanations)))
+            if len(pending) >= 2 * concurrency:
+                done_entry, future = pending.popleft()
+                yield done_entry, future.result
+        while pending:
+            done_entry, future = pending.popleft()
+            yield done_entry, future.result
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_quizzes_evaluation(model, prepared_quizzes, sentence_counts):
     """运行测验评估，按句子长度分类统计准确率"""
-    if not model or not quizzes:
+    if not model:
         return
     
-    # 初始化统计变量
-    total_stats = {
-        'short': {'total': 0, 'correct': 0, 'sentences': 0},
-        'medium': {'total': 0, 'correct': 0, 'sentences': 0},
-        'long': {'total': 0, 'correct': 0, 'sentences': 0}
-    }
+    # 初始化统计数组：行为句子类别，列为 (句子数量, 问题数量, 正确回答数量)
+    total_stats = np.zeros((len(CATEGORIES), 3), dtype=np.int64)
+    for category, count in sentence_counts.items():
+        total_stats[_CATEGORY_INDEX[category], _SENTENCES] = count
     
     print("=" * 80)
     print("开始评估测验题目...")
     print("=" * 80)
     
-    for idx, quiz in enumerate(quizzes):
-        sentence_id = quiz.get("sentence_id", "未知")
-        sentence = quiz.get("sentence", "")
-        quiz_data = quiz.get("quiz_data", {})
-        questions = quiz_data.get("questions", [])
-        dialect_explanations = quiz.get("dialect_explanations", None)  # 获取 dialect_explanations 参数
-        
-        print(f"\n处理句子 ID: {sentence_id}")
-        print(f"句子: {sentence}")
-        
-        # 根据句子长度确定类别
-        sentence_length = len(sentence)
-        if sentence_length < 30:
-        # if idx < 200:  # 前20题作为短句测试
-            category = 'short'
-        elif sentence_length < 100:
-            category = 'medium'
-        else:
-            category = 'long'
-        
-        total_stats[category]['sentences'] += 1
-        
-        # 查找对应的音频文件
-        audio_path = find_audio_file(sentence_id, audio_base_path)
-        if not audio_path:
-            print(f"警告: 未找到句子 {sentence_id} 的音频文件")
-            continue
-        
-        print(f"使用音频文件: {os.path.basename(audio_path)}")
-        print(f"句子长度: {sentence_length} 字符，类别: {category}")
-        
-        # 处理每个问题
-        for i, question_data in enumerate(questions):
-            question = question_data.get("question", "")
-            options = question_data.get("options", [])
-            correct_answer = question_data.get("answer", "")
+    # 循环内用到的配置项提前读取为局部变量
+    use_dialect_explanations = getattr(config, 'USE_DIALECT_EXPLANATIONS', False)
+    concurrency = getattr(config, 'LLM_CONCURRENCY', 1) or 1
+    
+    # 远程 API 模型是 IO 密集型，可并发提交各句子的请求；结果仍按原顺序输出
+    quiz_answers = iter_quiz_answers(model, prepared_quizzes, use_dialect_explanations, concurrency)
+    try:
+        for (quiz, category, audio_path), get_answers in quiz_answers:
+            sentence_id = quiz.get("sentence_id", "未知")
+            sentence = quiz.get("sentence", "")
+            questions = quiz.get("quiz_data", {}).get("questions", [])
             
-            print(f"\n问题 {i+1}: {question}")
-            for option in options:
-                print(f"  {option}")
+            # 每个句子的输出先写入缓冲，再一次性写出，减少逐行 print 的开销
+            out = [
+                f"\n处理句子 ID: {sentence_id}\n",
+                f"句子: {sentence}\n",
+                f"使用音频文件: {os.path.basename(audio_path)}\n",
+                f"句子长度: {len(sentence)} 字符，类别: {category}\n",
+            ]
+            # 在调用模型前写出句子信息，使模型内部的输出仍位于其后
+            sys.stdout.write(''.join(out))
+            out.clear()
             
-            # 调用模型的answer函数
+            # 调用模型的answer_batch函数
             try:
-                if config.USE_DIALECT_EXPLANATIONS and dialect_explanations:
-                    model_answer = model.answer(audio_path, question, options, dialect_explanations=dialect_explanations)
-                else:
-                    model_answer = model.answer(audio_path, question, options)
+                model_answers = get_answers()
+            except Exception as e:
+                print(f"处理问题时出错: {e}")
+                continue
+            if len(model_answers) != len(questions):
+                # 返回的答案数量与问题数量不一致时，缺少的答案按回答错误计入统计
+                out.append(f"警告: 模型返回了 {len(model_answers)} 个答案，问题共 {len(questions)} 个\n")
+                model_answers = list(model_answers[:len(questions)]) + [None] * (len(questions) - len(model_answers))
+            
+            # 处理每个问题；计数先累加到局部变量，句子处理完后再写入统计数组
+            num_total = 0
+            num_correct = 0
+            for i, (question_data, model_answer) in enumerate(zip(questions, model_answers)):
+                question = question_data.get("question", "")
+                options = question_data.get("options", [])
+                correct_answer = question_data.get("answer", "")
                 
-                print(f"模型答案: {model_answer}")
-                print(f"正确答案: {correct_answer}")
+                out.append(f"\n问题 {i+1}: {question}\n")
+                for option in options:
+                    out.append(f"  {option}\n")
+                
+                if isinstance(model_answer, Exception):
+                    # 与逐题调用时一致：出错的问题不计入统计
+                    out.append(f"处理问题时出错: {model_answer}\n")
+                    continue
+                
+                out.append(f"模型答案: {model_answer}\n")
+                out.append(f"正确答案: {correct_answer}\n")
                 
                 # 检查答案是否正确
                 if model_answer == correct_answer:
-                    print("✓ 正确")
-                    total_stats[category]['correct'] += 1
+                    out.append("✓ 正确\n")
+                    num_correct += 1
                 else:
-                    print("✗ 错误")
+                    out.append("✗ 错误\n")
                 
-                total_stats[category]['total'] += 1
-                
-            except Exception as e:
-                print(f"处理问题时出错: {e}")
-                continue
+                num_total += 1
+            
+            cat_idx = _CATEGORY_INDEX[category]
+            total_stats[cat_idx, _TOTAL] += num_total
+            total_stats[cat_idx, _CORRECT] += num_correct
+            sys.stdout.write(''.join(out))
+    finally:
+        # 提前退出（如 Ctrl+C）时关闭生成器，取消尚未开始的请求
+        quiz_answers.close()
     
     # 打印总体结果
     print("\n" + "=" * 80)
@@ -153,8 +278,9 @@ def run_quizzes_evaluation(model, quizzes, audio_base_path):
     print("=" * 80)
     
     # 总统计
-    total_questions = sum(stats['total'] for stats in total_stats.values())
-    total_correct = sum(stats['correct'] for stats in total_stats.values())
+    totals = total_stats.sum(axis=0)
+    total_questions = int(totals[_TOTAL])
+    total_correct = int(totals[_CORRECT])
     
     print(f"总问题数: {total_questions}")
     print(f"总正确回答: {total_correct}")
@@ -169,37 +295,43 @@ def run_quizzes_evaluation(model, quizzes, audio_base_path):
     print("\n按句子长度分类统计:")
     print("-" * 40)
     
-    for category, stats in total_stats.items():
-        if stats['total'] > 0:
-            accuracy = stats['correct'] / stats['total'] * 100
+    for category, (sentences, total, correct) in zip(CATEGORIES, total_stats.tolist()):
+        if total > 0:
+            accuracy = correct / total * 100
             print(f"{category.capitalize()}类别 (<30字: {category=='short'}, 30-99字: {category=='medium'}, ≥100字: {category=='long'}):")
-            print(f"  句子数量: {stats['sentences']}")
-            print(f"  问题数量: {stats['total']}")
-            print(f"  正确回答: {stats['correct']}")
+            print(f"  句子数量: {sentences}")
+            print(f"  问题数量: {total}")
+            print(f"  正确回答: {correct}")
             print(f"  准确率: {accuracy:.2f}%")
         else:
             print(f"{category.capitalize()}类别: 无相关问题")
 
 if __name__ == '__main__':
-    # 打印配置信息
-    config.print_config()
+    # 打印配置信息（仅在设置环境变量 DIALECT_IOU_VERBOSE=1 时）
+    if os.environ.get('DIALECT_IOU_VERBOSE', '0') == '1':
+        config.print_config()
     
     # 检查配置的路径
     if not os.path.isdir(config.AUDIO_BASE_PATH):
         print(f"错误: 配置的音频根目录 AUDIO_BASE_PATH 不存在: '{config.AUDIO_BASE_PATH}'")
     else:
-        # 动态加载并实例化模型
-        model_instance = get_model_instance()
+        # 先加载测验数据并解析音频路径，再加载模型
+        quizzes_path = getattr(config, 'QUIZZES_PATH', 'ShangHaiQuizzes.json')
+        quizzes = load_quizzes(quizzes_path)
         
-        if model_instance:
-            # 加载测验数据
-            quizzes_path = getattr(config, 'QUIZZES_PATH', 'ShangHaiQuizzes.json')
-            quizzes = load_quizzes(quizzes_path)
+        if quizzes is not None:
+            prepared_quizzes, sentence_counts = prepare_quizzes(quizzes, config.AUDIO_BASE_PATH)
             
-            if quizzes:
-                # 运行评估
-                run_quizzes_evaluation(
-                    model=model_instance,
-                    quizzes=quizzes,
-                    audio_base_path=config.AUDIO_BASE_PATH
-                )
\ No newline at end of file
+            if not prepared_quizzes:
+                print("没有找到任何带音频的测验题目，跳过模型加载。")
+            else:
+                # 动态加载并实例化模型
+                model_instance = get_model_instance()
+                
+                if model_instance:
+                    # 运行评估
+                    run_quizzes_evaluation(
+                        model=model_instance,
+                        prepared_quizzes=prepared_quizzes,
+                        sentence_counts=sentence_counts
+                    )
\ No newline at end of file
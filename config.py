@@ -17,7 +17,29 @@ MODEL_CONFIGS = {
     "QwenAudioModel": {
         "module_name": "models.qwen_model",
         "model_path": "../Qwen2-Audio-7B-Instruct",
-        "processor_path": "../Qwen2-Audio-7B-Instruct"
+        "processor_path": "../Qwen2-Audio-7B-Instruct",
+        # 单次 generate 的最大样本数（BATCH_SIZE 更大时会拆分为多个子 batch）
+        "max_batch_size": 8,
+        # GPU 上加载权重的精度；注意力实现为 flash_attention_2 时需安装 flash-attn，否则自动回退为 sdpa
+        "torch_dtype": "bfloat16",
+        "attn_implementation": "flash_attention_2",
+        # 是否用 torch.compile 编译模型 forward（首次推理需额外编译时间，适合长时间的评估）
+        "compile": False,
+        # 自行编码一次音频并以 inputs_embeds 调用 generate，使 ASR 与提取两个阶段共用音频编码结果
+        "reuse_audio_embeds": True,
+        # 是否在独立的 CUDA 流上预先把下一个 batch 的输入拷贝到显存（需 PREFETCH_WORKERS > 0），与当前 batch 的推理重叠
+        "h2d_stream": True,
+        # 是否改用 vLLM 推理（需安装 vllm；未安装时自动回退为 transformers）
+        "use_vllm": False,
+        "gpu_memory_utilization": 0.9,
+        # 可选：方言词表文件（每行一个或多个词），ASR 文本命中不少于 lexicon_min_matches 个词时不再调用模型提取方言词
+        "dialect_lexicon_path": None,
+        "lexicon_min_matches": 1,
+        # 可选：常用字表文件（如常用 3500 字），ASR 文本全部由表中的字组成时不再调用模型提取方言词
+        "basic_vocab_path": None,
+        # 是否按音频内容缓存阶段一的 ASR 结果（SQLite，存放于 cache_dir）
+        "enable_cache": False,
+        "cache_dir": ".cache"
     },
     "KimiAudioModel": {
         "module_name": "models.kimi_model",
@@ -33,7 +55,15 @@ MODEL_CONFIGS = {
             "audio_repetition_window_size": 64,
             "text_repetition_penalty": 1.0,
             "text_repetition_window_size": 16,
-        }
+        },
+        # 可选：方言词表文件（每行一个或多个词），ASR 文本命中不少于 lexicon_min_matches 个词时不再调用模型提取方言词
+        "dialect_lexicon_path": None,
+        "lexicon_min_matches": 1,
+        # 可选：常用字表文件（如常用 3500 字），ASR 文本全部由表中的字组成时不再调用模型提取方言词
+        "basic_vocab_path": None,
+        # 是否缓存生成结果（SQLite，存放于 cache_dir），重复运行同一实验时跳过推理
+        "enable_cache": False,
+        "cache_dir": ".cache"
     },
     "ParaformerLlmApiModel": {
         "module_name": "models.paraformer_llm_api_model",
@@ -41,7 +71,21 @@ MODEL_CONFIGS = {
         "model_path": "/mnt/sda/ASR/model/speech_paraformer-large-vad-punc_asr_nat-zh-cn-16k-common-vocab8404-pytorch",#"/mnt/sda/ASR/zhanghui/FunASR/inference_model/secondmodel/speech_seaco_paraformer_large_asr_nat-zh-cn-16k-common-vocab8404-jingzhou",
         "llm_api_url": "https://api.siliconflow.cn/v1/chat/completions",
         "llm_model_name": "Qwen/Qwen2.5-7B-Instruct",
-        "llm_input_source": "paraformer"
+        "llm_input_source": "paraformer",
+        # 可选：单独的 VAD / 标点模型（如 "fsmn-vad"、"ct-punc"）；model_path 已包含 VAD 与标点时保持为 None
+        "vad_model": None,
+        "punc_model": None,
+        # 是否改用 funasr_onnx（ONNX Runtime）在 CPU 上推理；需先导出 ONNX 模型，onnx_quantize 为 True 时加载 int8 量化模型
+        "use_onnx": False,
+        "onnx_quantize": True,
+        "onnx_batch_size": 8,
+        # process_batch 中并发请求 LLM API 的线程数（BATCH_SIZE > 1 时生效）
+        "llm_concurrency": 4,
+        # 每次 LLM 请求合并的转写条数（按序号逐行返回），为 1 时每条转写单独请求
+        "llm_batch_size": 8,
+        # 是否缓存 LLM API 返回结果（SQLite，存放于 cache_dir），相同提示词不再重复请求
+        "enable_cache": False,
+        "cache_dir": ".cache"
     },
     "StepAudioModel": {
         "module_name": "models.step_model",
@@ -50,7 +94,13 @@ MODEL_CONFIGS = {
         "stepaudio_root_path": "../Step-Audio2",
         "max_new_tokens": 1024,
         "temperature": 0.1,
-        "do_sample": True
+        "do_sample": True,
+        # 阶段二（提取方言词）是否再次传入音频；False 时只用阶段一的识别文本，省去一次音频编码
+        "reencode_audio_for_extraction": False,
+        # 回答选择题（answer）时的最大生成长度，只需输出一个选项字母
+        "answer_max_new_tokens": 4,
+        # 模型权重的精度；StepAudio2 构造后统一转换，减半 float32 权重在解码时每个 token 读取的显存带宽；None 表示保持库的默认精度
+        "torch_dtype": "bfloat16"
     }
 }
 
@@ -72,14 +122,39 @@ DEVICE = "cuda:1" if torch.cuda.is_available() else "cpu"
 # 是否在调用模型时传递 dialect_explanations 参数
 USE_DIALECT_EXPLANATIONS = False
 
+# 测验评估时并发调用模型的线程数；仅适用于远程 API 模型（如 ParaformerLlmApiModel），本地 GPU 模型请保持为 1
+LLM_CONCURRENCY = 1
+
+# 评估时每次交给模型 process_batch 的样本数；支持批量推理的模型（如 QwenAudioModel）可调大以提高 GPU 利用率
+BATCH_SIZE = 1
+
+# 评估时在后台预加载下一个 batch 音频的线程数，0 表示不预加载；仅对实现了 load_audio 的模型（如 QwenAudioModel；StepAudioModel 只预读文件到页缓存）有效
+PREFETCH_WORKERS = 2
+
+# 预加载时最多提前准备的 batch 数（音频解码 + 模型的 prepare_batch 预处理）
+PREFETCH_DEPTH = 2
+
+# 评估开始前用 os.scandir 遍历一次音频根目录，用集合判断音频是否存在；音频目录下有大量无关文件时可关闭
+PREWALK_AUDIO = True
+
+# 是否将文本文件的解析结果用 pickle 缓存到 PARSED_TEXT_CACHE_DIR（按路径、修改时间与大小区分），重复运行时不再逐行解析
+# 缓存文件会被 pickle.load 读取，只应放在本项目自己的缓存目录中
+PARSED_TEXT_CACHE = False
+PARSED_TEXT_CACHE_DIR = ".cache"
+
+# 评估时并发推理的 batch 数（线程池）；适用于远程 API 或 CPU 模型，单卡 GPU 模型请保持为 1 并调大 BATCH_SIZE
+NUM_WORKERS = 1
+
+# 多进程评估使用的 GPU 编号列表（如 [0, 1]），每块 GPU 一个进程、各加载一份模型；None 表示在当前进程中评估
+# 启用后 NUM_WORKERS / PREFETCH_WORKERS 不再生效；远程 API 模型需通过环境变量 LLM_API_KEY 提供 API Key
+EVAL_GPUS = None
+
 def print_config():
     """打印当前所有配置项，美化输出"""
     from pprint import pformat
     
-    print(f"\n{'-'*60}")
-    print(f"配置文件路径: {__file__}")
-    
-    print("\n当前加载的配置项:")
+    # 先收集所有输出行，最后一次性打印，避免逐行 print
+    lines = [f"\n{'-'*60}", f"配置文件路径: {__file__}", "\n当前加载的配置项:"]
     
     # 收集所有非系统属性
     config_items = [
@@ -96,30 +171,31 @@ def print_config():
     for key, value in config_items:
         if key == 'MODEL_CONFIGS':
             # 特殊处理嵌套配置
-            print(f"  {key:<{max_key_len}} →")
+            lines.append(f"  {key:<{max_key_len}} →")
             for model, config in value.items():
-                print(f"    ├── {model}:")
+                lines.append(f"    ├── {model}:")
                 for k, v in config.items():
                     if isinstance(v, dict):
-                        print(f"    │   ├── {k}:")
+                        lines.append(f"    │   ├── {k}:")
                         for sk, sv in v.items():
-                            print(f"    │   │   ├── {sk} = {sv}")
+                            lines.append(f"    │   │   ├── {sk} = {sv}")
                     else:
-                        print(f"    │   ├── {k} = {v}")
+                        lines.append(f"    │   ├── {k} = {v}")
             continue
         
         # 普通配置项处理
         if isinstance(value, str) and ('/' in value or '\\' in value):
             # 路径类型的美化
-            print(f"  {key:<{max_key_len}} → ├─{value}")
+            lines.append(f"  {key:<{max_key_len}} → ├─{value}")
         elif isinstance(value, (list, dict, tuple, set)):
             # 复杂结构的格式化
             formatted = pformat(value, width=100, compact=True, indent=2)
-            print(f"  {key:<{max_key_len}} → \n{formatted}")
+            lines.append(f"  {key:<{max_key_len}} → \n{formatted}")
         else:
-            print(f"  {key:<{max_key_len}} → {value}")
+            lines.append(f"  {key:<{max_key_len}} → {value}")
     
-    print('-'*60 + '\n')
+    lines.append('-'*60 + '\n')
+    print('\n'.join(lines))
 
 # 初始化时自动打印配置（可选）
 if __name__ == '__main__':
@@ -1,6 +1,65 @@
+# dialect_iou.py
+# 方言词标注 + IoU 评分的独立演示脚本，只依赖标准库（pyahocorasick 可选），
+# 因此可以直接用 PyPy 运行以加速大批量评分：pypy3 dialect_iou.py
+
 import re
 import random
-from typing import List, Tuple, Set
+import functools
+from typing import List, Tuple
+
+try:
+    # 可选依赖：pyahocorasick，一次扫描即可找出所有方言词的出现位置
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 统计位掩码中置位的个数；int.bit_count 需要 Python 3.10+，旧版本（如 PyPy 3.9）退回 bin().count
+_popcount = getattr(int, 'bit_count', None) or (lambda x: bin(x).count('1'))
+
+# 预编译的正则：方言词列表中需要去除的符号
+_BRACKET_RE = re.compile(r'[【】{}]')
+@functools.lru_cache(maxsize=1024)
+def _build_automaton(words: Tuple[str, ...]):
+    """[辅助函数] 为一组（已去重排序的）方言词构建 Aho-Corasick 自动机，同一词表只构建一次。"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+def _find_word_intervals(transcription: str, dialect_words: List[str]) -> List[Tuple[int, int]]:
+    """
+    [辅助函数] 在标注文本中找出所有方言词出现的区间 (start, end)。
+
+    与逐词 finditer 的结果一致：同一个词的匹配互不重叠，不同词之间的区间可以重叠。
+    """
+    unique_words = set(dialect_words) # 使用 set 去重，避免重复查找
+    if not unique_words:
+        return []
+
+    intervals = []
+    if ahocorasick is not None:
+        # 单次扫描标注文本，按结束位置依次得到所有词的命中
+        last_end = {}
+        for end_idx, word in _build_automaton(tuple(sorted(unique_words))).iter(transcription):
+            start = end_idx - len(word) + 1
+            # 跳过与该词上一次匹配重叠的命中，保持 finditer 的不重叠语义
+            if start < last_end.get(word, 0):
+                continue
+            last_end[word] = end_idx + 1
+            intervals.append((start, end_idx + 1))
+        return intervals
+
+    for word in unique_words:
+        # 先用 C 层的子串查找排除未出现的词，再用 str.find 逐个定位不重叠的匹配项（无需正则转义）
+        if not word or word not in transcription:
+            continue
+        word_len = len(word)
+        idx = transcription.find(word)
+        while idx >= 0:
+            intervals.append((idx, idx + word_len))
+            idx = transcription.find(word, idx + word_len)
+    return intervals
 
 def process_line_to_ground_truth(line: str) -> Tuple[str, str]:
     """
@@ -29,71 +88,87 @@ def process_line_to_ground_truth(line: str) -> Tuple[str, str]:
     
     # 1. 清理和提取方言词
     # 去除 【】{} 等符号
-    dialect_words_cleaned = re.sub(r'[【】{}]', '', dialect_words_raw)
+    dialect_words_cleaned = _BRACKET_RE.sub('', dialect_words_raw)
     # 按逗号分割，并去除空字符串
     dialect_words = [word for word in dialect_words_cleaned.split(',') if word]
 
     # 2. 在标注文本中找到所有方言词的区间
-    intervals_to_mark = []
-    for word in set(dialect_words): # 使用 set 去重，避免重复查找
-        # 使用 re.finditer 找到所有不重叠的匹配项
-        for match in re.finditer(re.escape(word), transcription):
-            intervals_to_mark.append((match.start(), match.end()))
+    intervals_to_mark = _find_word_intervals(transcription, dialect_words)
             
     # 如果没有找到任何区间，直接返回原始文本
     if not intervals_to_mark:
         return filename, transcription
 
     # 3. 根据区间构建带 <> 标记的GT文本
-    # 按起始位置对区间进行排序，以便正确插入标记
+    # 按起始位置对区间进行排序，并合并相互重叠的区间（如 "门子" 与 "子"），避免生成嵌套或重复的标记
     intervals_to_mark.sort()
+    merged = [intervals_to_mark[0]]
+    for start, end in intervals_to_mark[1:]:
+        if start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
     
-    new_text_parts = []
+    # 逐段收集到列表后一次 join，总开销与文本长度成线性
+    pieces = []
     last_pos = 0
-    for start, end in intervals_to_mark:
-        # 添加上一个标记到当前标记之间的文本
-        new_text_parts.append(transcription[last_pos:start])
-        # 添加带标记的方言词
-        new_text_parts.append(f"<{transcription[start:end]}>")
+    for start, end in merged:
+        # 上一个标记到当前标记之间的文本 + 带标记的方言词
+        pieces.append(transcription[last_pos:start])
+        pieces.append(f"<{transcription[start:end]}>")
         last_pos = end
     
     # 添加最后一个标记之后剩余的文本
-    new_text_parts.append(transcription[last_pos:])
-    
-    gt_text = "".join(new_text_parts)
+    pieces.append(transcription[last_pos:])
     
-    return filename, gt_text
+    return filename, "".join(pieces)
 
 
-def _extract_char_indices(text_with_markup: str) -> Set[int]:
+def _extract_char_mask(text_with_markup: str) -> int:
     """
-    [辅助函数] 从带 <> 标记的文本中提取所有被标记字符的索引。
+    [辅助函数] 从带 <> 标记的文本中提取所有被标记字符的索引，以位掩码表示。
     
     例如，对于 "你好<世界>和平"，它会识别出 "世界" 被标记。
     在无标记文本 "你好世界和平" 中，"世" 的索引是2，"界"是3。
-    函数将返回 {2, 3}。
+    函数将返回 0b1100（第2、3位为1）。
     
     Args:
         text_with_markup (str): 包含 <> 标记的字符串。
 
     Returns:
-        Set[int]: 一个包含所有被标记字符在“纯文本”中索引的集合。
+        int: 位掩码，第 i 位为 1 表示“纯文本”中索引为 i 的字符被标记。
     """
-    indices = set()
+    mask = 0
+    pos = 0
     plain_text_pos = 0
-    in_markup = False
     
-    for char in text_with_markup:
-        if char == '<':
-            in_markup = True
-        elif char == '>':
-            in_markup = False
-        else:
-            if in_markup:
-                indices.add(plain_text_pos)
-            plain_text_pos += 1
+    # 用 str.find 在 <> 之间跳转，按区间整段置位，而不是逐字符判断
+    while True:
+        lt = text_with_markup.find('<', pos)
+        if lt < 0:
+            break
+        # 标记外的文本段；其中游离的 '>' 不计入纯文本位置
+        plain_text_pos += (lt - pos) - text_with_markup.count('>', pos, lt)
+        gt = text_with_markup.find('>', lt + 1)
+        end = gt if gt >= 0 else len(text_with_markup)
+        # 标记内的文本段；其中重复出现的 '<' 同样不计入
+        span = (end - lt - 1) - text_with_markup.count('<', lt + 1, end)
+        mask |= ((1 << span) - 1) << plain_text_pos
+        plain_text_pos += span
+        if gt < 0:
+            break
+        pos = gt + 1
             
-    return indices
+    return mask
+
+@functools.lru_cache(maxsize=None)
+def _gt_char_mask(gt_text: str) -> int:
+    """
+    [辅助函数] 带缓存的 GT 位掩码。
+
+    同一份 GT 文本会与多个模型/多次运行的 Hyp 比较，缓存后每次只需提取 Hyp 一侧。
+    """
+    return _extract_char_mask(gt_text)
 
 def calculate_text_iou(gt_text: str, hyp_text: str) -> float:
     """
@@ -111,13 +186,23 @@ def calculate_text_iou(gt_text: str, hyp_text: str) -> float:
                - 如果 GT 和 Hyp 的标记都为空，IoU 为 1.0。
                - 如果其中一个为空而另一个不为空，IoU 为 0.0。
     """
-    # 1. 提取 GT 和 Hyp 中被标记的字符索引集合
-    gt_indices = _extract_char_indices(gt_text)
-    hyp_indices = _extract_char_indices(hyp_text)
+    # 0. 快速路径：任一侧没有 '<' 时无需同时提取两侧的位掩码
+    gt_has_markup = '<' in gt_text
+    hyp_has_markup = '<' in hyp_text
+    if not gt_has_markup and not hyp_has_markup:
+        return 1.0
+    if not gt_has_markup or not hyp_has_markup:
+        # 交集必为空；只有另一侧的标记也为空（如 "<>"）时 IoU 才为 1.0
+        marked_mask = _gt_char_mask(gt_text) if gt_has_markup else _extract_char_mask(hyp_text)
+        return 0.0 if marked_mask else 1.0
+
+    # 1. 提取 GT 和 Hyp 中被标记字符的位掩码
+    gt_mask = _gt_char_mask(gt_text)
+    hyp_mask = _extract_char_mask(hyp_text)
     
-    # 2. 计算交集和并集的大小
-    intersection_size = len(gt_indices.intersection(hyp_indices))
-    union_size = len(gt_indices.union(hyp_indices))
+    # 2. 计算交集和并集的大小（按位与/或后统计置位数）
+    intersection_size = _popcount(gt_mask & hyp_mask)
+    union_size = _popcount(gt_mask | hyp_mask)
     
     # 3. 计算 IoU
     if union_size == 0:
@@ -128,6 +213,54 @@ def calculate_text_iou(gt_text: str, hyp_text: str) -> float:
     return iou
 
 
+# 模拟模型用到的预编译正则
+_MARK_RE = re.compile(r'<(.*?)>')
+# 去除 <> 标记用的转换表，str.translate 比正则替换更快
+_STRIP_MARKS = str.maketrans('', '', '<>')
+_SPACE_SPLIT_RE = re.compile(r'(\s+)')
+
+def _perfect_match(gt_text: str) -> str:
+    """完美匹配"""
+    return gt_text
+
+def _drop_mark(gt_text: str) -> str:
+    """漏掉一个标记 (False Negative)"""
+    match = _MARK_RE.search(gt_text)
+    if match:
+        # 只移除第一个找到的标记
+        return gt_text.replace(match.group(0), match.group(1), 1)
+    return gt_text # 如果没有标记，则返回原样
+
+def _shrink_mark(gt_text: str) -> str:
+    """边界错误"""
+    match = _MARK_RE.search(gt_text)
+    if match and len(match.group(1)) > 1:
+        # 将标记缩短一个字符
+        content = match.group(1)
+        new_content = f"<{content[:-1]}>"
+        return gt_text.replace(match.group(0), new_content, 1)
+    return gt_text
+
+def _add_false_mark(gt_text: str) -> str:
+    """增加一个错误标记 (False Positive)"""
+    plain_text = gt_text.translate(_STRIP_MARKS)
+    words = _SPACE_SPLIT_RE.split(plain_text) # 按空格分割以模拟词
+    words = [w for w in words if w.strip()]
+    if words:
+        random_word_idx = random.randint(0, len(words) - 1)
+        word_to_mark = words[random_word_idx]
+        # 确保只标记一次，避免无限替换
+        return plain_text.replace(word_to_mark, f"<{word_to_mark}>", 1)
+    return plain_text
+
+def _drop_all_marks(gt_text: str) -> str:
+    """完全不匹配"""
+    return gt_text.translate(_STRIP_MARKS)
+
+# 各种模拟结果及其概率：30% 完美匹配，20% 漏标，20% 边界错误，20% 误标，10% 完全不匹配
+_OUTCOMES = [_perfect_match, _drop_mark, _shrink_mark, _add_false_mark, _drop_all_marks]
+_WEIGHTS = [0.3, 0.2, 0.2, 0.2, 0.1]
+
 def dummy_multimodal_model(audio_filename: str, gt_text: str) -> str:
     """
     一个模拟的多模态语音大模型函数。
@@ -142,43 +275,8 @@ def dummy_multimodal_model(audio_filename: str, gt_text: str) -> str:
     Returns:
         str: 一个模拟的、带标记的 Hypothesis 文本。
     """
-    # 移除所有标记以获取纯文本
-    plain_text = re.sub(r'[<>]', '', gt_text)
-    
-    # 随机选择一种错误类型来模拟
-    choice = random.random()
-
-    if choice < 0.3: # 30% 概率：完美匹配
-        return gt_text
-    
-    elif choice < 0.5: # 20% 概率：漏掉一个标记 (False Negative)
-        match = re.search(r'<(.*?)>', gt_text)
-        if match:
-            # 只移除第一个找到的标记
-            return gt_text.replace(match.group(0), match.group(1), 1)
-        return gt_text # 如果没有标记，则返回原样
-
-    elif choice < 0.7: # 20% 概率：边界错误
-        match = re.search(r'<(.*?)>', gt_text)
-        if match and len(match.group(1)) > 1:
-            # 将标记缩短一个字符
-            content = match.group(1)
-            new_content = f"<{content[:-1]}>"
-            return gt_text.replace(match.group(0), new_content, 1)
-        return gt_text
-
-    elif choice < 0.9: # 20% 概率：增加一个错误标记 (False Positive)
-        words = re.split(r'(\s+)', plain_text) # 按空格分割以模拟词
-        words = [w for w in words if w.strip()]
-        if words:
-            random_word_idx = random.randint(0, len(words) - 1)
-            word_to_mark = words[random_word_idx]
-            # 确保只标记一次，避免无限替换
-            return plain_text.replace(word_to_mark, f"<{word_to_mark}>", 1)
-        return plain_text
-
-    else: # 10% 概率：完全不匹配
-        return plain_text
+    # 按概率随机选择一种错误类型来模拟
+    return random.choices(_OUTCOMES, _WEIGHTS)[0](gt_text)
 
 
 def main(file_path: str):
@@ -203,7 +301,7 @@ def main(file_path: str):
     processed_lines = 0
 
     for i, line in enumerate(lines):
-        if not line.strip(): # 跳过空行
+        if not line or line[0] in '\n#' or line.isspace(): # 跳过空行和 # 注释行
             continue
             
         filename, gt_text = process_line_to_ground_truth(line)
@@ -4,8 +4,13 @@
 
 import os
 import re
-import importlib
+import json
+import mmap
+import queue
+import logging
+import logging.handlers
 import sys
+import threading
 import glob
 import datetime
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -13,33 +18,13 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import config
 
 # 从工具模块导入函数
-from my_utils.text_processing import process_line_to_ground_truth
+from my_utils.runner import get_model_instance, load_external_evaluator, iter_process_batches
+from my_utils.audio_prefetch import iter_prefetched_batches, walk_audio_paths
+from my_utils.parallel_eval import run_eval_parallel
+from my_utils.text_processing import iter_parsed_lines, iter_batches, iter_samples
 
-def get_model_instance():
-    """动态导入并实例化所选的模型。"""
-    try:
-        model_name = config.SELECTED_MODEL
-        model_config = config.MODEL_CONFIGS[model_name]
-        
-        # 动态地从 models 包中导入对应的模块
-        module_name = model_config['module_name']
-        model_module = importlib.import_module(module_name)
-        
-        # 从模块中获取模型类
-        ModelClass = getattr(model_module, model_name)
-        
-        # 实例化模型
-        print(f"正在实例化模型: {model_name}")
-        instance = ModelClass(
-            device=config.DEVICE,
-            **model_config
-        )
-        return instance
-
-    except (ImportError, KeyError, AttributeError) as e:
-        print(f"错误: 无法加载模型 '{config.SELECTED_MODEL}'。请检查 'config.py' 和 'models' 文件夹。")
-        print(f"详细错误: {e}")
-        return None
+# 预编译的正则：log 中的已处理文件行
+_WAV_RE = re.compile(r"文件: (.+\.wav)$")
 
 def find_latest_log_file():
     """查找最新的log文件（格式：YYYY-MM-DD_HH-MM-SS.log）"""
@@ -51,68 +36,233 @@ def find_latest_log_file():
     log_files.sort(reverse=True)
     return log_files[0]
 
+def _collect_rolling_values(lines):
+    """从 rolling_recall_avg 所在行开始，收集连续的 rolling_* 键值对"""
+    rolling_values = {}
+    for line in lines:
+        current_line = line.strip()
+        if not current_line.startswith("rolling_"):
+            # 遇到非rolling行，停止
+            break
+        # 用 partition 一次切分出键和值，不分配中间列表；没有 " : " 的rolling行直接跳过
+        key, sep, value = current_line.partition(" : ")
+        if sep:
+            try:
+                rolling_values[key.rstrip()] = float(value)
+            except ValueError:
+                pass
+    return rolling_values
+
+# log 中每个已处理文件对应的行首标记
+_FILE_MARKER = '文件: '.encode('utf-8')
+
+def _count_processed(buf):
+    """
+    在字节缓冲区（bytes 或 mmap）中统计以 "文件: " 开头的行数，即已处理的文件数量。
+
+    计数完全在 C 层完成；mmap.count 需要 Python 3.13+，旧版本用 find 逐个跳转。
+    """
+    sub = b'\n' + _FILE_MARKER
+    if hasattr(buf, 'count'):
+        count = buf.count(sub)
+    else:
+        count = 0
+        pos = buf.find(sub)
+        while pos >= 0:
+            count += 1
+            pos = buf.find(sub, pos + len(sub))
+    # 第一行前面没有换行符，单独判断
+    if buf[:len(_FILE_MARKER)] == _FILE_MARKER:
+        count += 1
+    return count
+
+def _iter_mmap_lines(mm, start):
+    """从字节偏移 start 开始，逐行解码 mmap 中的内容"""
+    size = len(mm)
+    while start < size:
+        end = mm.find(b'\n', start)
+        if end < 0:
+            end = size
+        yield mm[start:end].decode('utf-8', errors='replace')
+        start = end + 1
+
+def _check_offset(file_line, offset_line, last_processed_file):
+    """解析 OFFSET 行；仅当其上一行记录的文件就是最后处理的文件时返回偏移，否则返回 None"""
+    match = _WAV_RE.match(file_line)
+    if not match or match.group(1) != last_processed_file:
+        return None
+    try:
+        return int(offset_line.strip()[len("OFFSET: "):])
+    except ValueError:
+        return None
+
+def _parse_log_mmap(mm):
+    """
+    通过 mmap 从文件末尾反向查找，只解码需要的尾部片段。
+
+    Returns:
+        (last_processed_file, last_rolling_values, processed_count, last_offset)
+    """
+    marker = _FILE_MARKER
+    
+    # 统计已处理的文件数量：直接在字节上查找，无需逐行解码
+    processed_count = _count_processed(mm)
+    
+    # 从后往前查找最后处理的文件
+    last_processed_file = None
+    end = len(mm)
+    while end > 0:
+        pos = mm.rfind(b'\n' + marker, 0, end)
+        if pos < 0:
+            # 文件第一行
+            if mm[:len(marker)] != marker:
+                break
+            start = 0
+        else:
+            start = pos + 1
+        line = next(_iter_mmap_lines(mm, start), '').strip()
+        if line.endswith('.wav'):
+            match = _WAV_RE.match(line)
+            if match:
+                last_processed_file = match.group(1)
+                break
+        if pos < 0:
+            break
+        end = pos
+    
+    # 查找最后的rolling平均值，从该行开始向后收集
+    last_rolling_values = {}
+    idx = mm.rfind("rolling_recall_avg :".encode('utf-8'))
+    if idx >= 0:
+        line_start = mm.rfind(b'\n', 0, idx) + 1
+        last_rolling_values = _collect_rolling_values(_iter_mmap_lines(mm, line_start))
+    
+    # 查找最后记录的 OFFSET，只有紧挨着的上一行正是最后处理的文件时才可信
+    last_offset = None
+    pos = mm.rfind(b'\nOFFSET: ')
+    if pos >= 0:
+        prev_start = mm.rfind(b'\n', 0, pos) + 1
+        prev_line = mm[prev_start:pos].decode('utf-8', errors='replace').strip()
+        offset_line = next(_iter_mmap_lines(mm, pos + 1), '')
+        last_offset = _check_offset(prev_line, offset_line, last_processed_file)
+    
+    return last_processed_file, last_rolling_values, processed_count, last_offset
+
+def _parse_log_lines(lines, data):
+    """解析已读入内存的log内容（mmap 不可用时的回退路径）；lines 为 data 解码后的各行"""
+    last_processed_file = None
+    last_rolling_values = {}
+    
+    # 统计已处理的文件数量：与 mmap 路径相同，直接在字节上计数
+    processed_count = _count_processed(data)
+    
+    # 从后往前查找最后处理的文件；先用字符串判断过滤，只对候选行做正则匹配
+    for line in reversed(lines):
+        if '文件: ' in line and line.rstrip().endswith('.wav'):
+            match = _WAV_RE.match(line.strip())
+            if match:
+                last_processed_file = match.group(1)
+                break
+    
+    # 查找最后的rolling平均值
+    # 直接按下标倒序扫描，避免 lines.index 带来的整表线性查找
+    for current_line_idx in range(len(lines) - 1, -1, -1):
+        if "rolling_recall_avg :" in lines[current_line_idx]:
+            # 从这一行开始向后收集连续的rolling值
+            last_rolling_values = _collect_rolling_values(lines[current_line_idx:])
+            break
+    
+    # 查找最后记录的 OFFSET
+    last_offset = None
+    for idx in range(len(lines) - 1, 0, -1):
+        if lines[idx].startswith("OFFSET: "):
+            last_offset = _check_offset(lines[idx - 1].strip(), lines[idx], last_processed_file)
+            break
+    
+    return last_processed_file, last_rolling_values, processed_count, last_offset
+
 def parse_log_file(log_file_path):
-    """解析log文件，提取最后处理的文件和rolling平均值状态"""
+    """
+    解析log文件，提取最后处理的文件和rolling平均值状态。
+
+    优先用 mmap 只读取文件尾部所需的页；mmap 不可用（如空文件）时回退为整文件读入。
+    返回值中的 lines 仅在回退路径下为文件的全部行，否则为空列表；
+    last_offset 为最后处理的文件在文本文件中的结束字节偏移（旧 log 中没有记录时为 None）。
+    """
     if not os.path.exists(log_file_path):
         print(f"警告: log文件不存在: {log_file_path}")
-        return None, None, {}, 0
+        return None, None, {}, 0, None
     
     print(f"正在解析log文件: {log_file_path}")
     
-    last_processed_file = None
-    last_rolling_values = {}
-    processed_count = 0
-    
+    lines = []
     try:
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        # 统计已处理的文件数量
-        for line in lines:
-            if line.strip().startswith("文件: ") and line.strip().endswith(".wav"):
-                processed_count += 1
-        
-        # 从后往前查找最后处理的文件
-        for line in reversed(lines):
-            if line.strip().startswith("文件: ") and line.strip().endswith(".wav"):
-                match = re.search(r"文件: (.+\.wav)", line.strip())
-                if match:
-                    last_processed_file = match.group(1)
-                    break
-        
-        # 查找最后的rolling平均值
-        for line in reversed(lines):
-            if "rolling_recall_avg :" in line:
-                # 从这一行开始向前查找所有rolling值
-                current_line_idx = lines.index(line)
-                for i in range(current_line_idx, len(lines)):
-                    current_line = lines[i].strip()
-                    if current_line.startswith("rolling_") and " : " in current_line:
-                        parts = current_line.split(" : ")
-                        if len(parts) == 2:
-                            key = parts[0].strip()
-                            try:
-                                value = float(parts[1].strip())
-                                last_rolling_values[key] = value
-                            except ValueError:
-                                pass
-                    elif current_line.startswith("rolling_"):
-                        # 继续查找rolling值
-                        continue
-                    else:
-                        # 遇到非rolling行，停止
-                        break
-                break
+        with open(log_file_path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # 空文件无法 mmap
+                mm = None
+            
+            if mm is not None:
+                with mm:
+                    last_processed_file, last_rolling_values, processed_count, last_offset = _parse_log_mmap(mm)
+            else:
+                data = f.read()
+                lines = data.decode('utf-8').splitlines(keepends=True)
+                last_processed_file, last_rolling_values, processed_count, last_offset = _parse_log_lines(lines, data)
                 
     except Exception as e:
         print(f"解析log文件时出错: {e}")
-        return None, None, {}, 0
+        return None, None, {}, 0, None
     
     print(f"最后处理的文件是 {last_processed_file}")
     print(f"已处理文件数量: {processed_count}")
     print(f"找到的rolling值数量: {len(last_rolling_values)}")
+    if last_offset is not None:
+        print(f"最后记录的文本偏移: {last_offset}")
     
-    return last_processed_file, last_rolling_values, lines, processed_count
+    return last_processed_file, last_rolling_values, lines, processed_count, last_offset
+
+def _checkpoint_path(log_file_path):
+    """与log文件对应的checkpoint文件路径"""
+    return log_file_path + ".ckpt.json"
+
+def load_checkpoint(log_file_path):
+    """
+    读取与log文件对应的 checkpoint JSON，续接时无需重新扫描log。
+
+    Returns:
+        (last_processed_file, rolling_values, processed_count, last_offset)；文件不存在或损坏时返回 None。
+    """
+    checkpoint_path = _checkpoint_path(log_file_path)
+    if not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        result = (state["last_file"], state.get("rolling", {}), state.get("processed", 0), state.get("offset"))
+    except Exception as e:
+        print(f"警告: 读取checkpoint文件失败，改为解析log文件: {e}")
+        return None
+    print(f"从checkpoint文件恢复: {checkpoint_path}")
+    print(f"最后处理的文件是 {result[0]}")
+    print(f"已处理文件数量: {result[2]}")
+    print(f"找到的rolling值数量: {len(result[1])}")
+    return result
+
+def save_checkpoint(log_file_path, evaluator, last_file, processed_count, offset):
+    """每处理完一个文件后原子地更新 checkpoint JSON（先写临时文件再 os.replace）"""
+    rolling_values = {
+        key: value for key, value in vars(evaluator).items()
+        if key.startswith("rolling_") and isinstance(value, (int, float))
+    }
+    state = {"last_file": last_file, "processed": processed_count, "offset": offset, "rolling": rolling_values}
+    checkpoint_path = _checkpoint_path(log_file_path)
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
 
 def restore_evaluator_state(evaluator, rolling_values, processed_count):
     """恢复评估器的rolling平均值状态"""
@@ -133,31 +283,64 @@ def restore_evaluator_state(evaluator, rolling_values, processed_count):
             print(f"  恢复 {key} = {value}")
 
 
+class _LoggerStream:
+    """
+    替代 sys.stdout 的流对象：按整行转发给 logger，使外部评估器/模型内部的 print 也进入日志队列。
+    每个线程各有一份未满一行的缓冲，预加载线程、batch 线程与主线程的输出不会拼进同一行
+    （parse_log_file 续接时依赖完整的 "文件:" 与 rolling_* 行）。
+    """
+    
+    def __init__(self, logger):
+        self.logger = logger
+        self._local = threading.local()
+    
+    def write(self, obj):
+        buffer = getattr(self._local, 'buffer', '') + obj
+        if '\n' in buffer:
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                self.logger.info(line)
+        self._local.buffer = buffer
+    
+    def flush(self):
+        buffer = getattr(self._local, 'buffer', '')
+        if buffer:
+            self.logger.info(buffer)
+            self._local.buffer = ''
+
 def setup_logging(log_file_path):
-    """设置日志输出，将输出同时显示在终端和追加到log文件"""
+    """
+    设置日志输出，将输出同时显示在终端和追加到log文件。
+
+    主线程只把日志记录放入队列，由 QueueListener 的后台线程负责写终端和文件。
+
+    Returns:
+        (logger, listener)；未指定或无法打开日志文件时为 (None, None)。
+    """
     if not log_file_path:
-        return None
-    
-    class TeeOutput:
-        def __init__(self, *files):
-            self.files = files
-        
-        def write(self, obj):
-            for f in self.files:
-                f.write(obj)
-                f.flush()
-        
-        def flush(self):
-            for f in self.files:
-                f.flush()
+        return None, None
     
     try:
-        log_file = open(log_file_path, 'a', encoding='utf-8')
-        tee = TeeOutput(sys.stdout, log_file)
-        return tee, log_file
+        file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
     except Exception as e:
         print(f"警告: 无法打开日志文件 {log_file_path}: {e}")
         return None, None
+    
+    # 只输出消息本身，保持与 print 相同的日志格式，parse_log_file 才能继续解析
+    formatter = logging.Formatter("%(message)s")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (stream_handler, file_handler):
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("eval")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+    listener.start()
+    return logger, listener
 
 def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_file_path=None):
     """带checkpoint的主评估流程"""
@@ -168,12 +351,14 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
         log_file_path = find_latest_log_file()
     
     # 设置日志输出
-    tee_output, log_file = setup_logging(log_file_path)
+    logger, listener = setup_logging(log_file_path)
+    log = logger.info if logger else print
     original_stdout = sys.stdout
     
     try:
-        if tee_output:
-            sys.stdout = tee_output
+        if logger:
+            # 其余 print（包括外部评估器内部的输出）也经由日志队列写出
+            sys.stdout = _LoggerStream(logger)
         
         # 添加续接标识
         print("\n" + "="*80)
@@ -187,10 +372,8 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
             print(f"将输出追加到日志文件: {log_file_path}")
         print("-" * 80)
 
-        try:
-            with open(text_file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except FileNotFoundError:
+        # 文本文件在循环中逐行读取，这里只检查是否存在
+        if not os.path.isfile(text_file_path):
             print(f"错误: 文本文件 '{text_file_path}' 未找到。")
             return
 
@@ -198,14 +381,20 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
         last_processed_file = None
         rolling_values = {}
         processed_count = 0
+        last_offset = None
         
         if log_file_path:
-            last_processed_file, rolling_values, _, processed_count = parse_log_file(log_file_path)
+            # 优先读取 checkpoint JSON；不存在时（如旧的log）回退到解析log文件
+            checkpoint = load_checkpoint(log_file_path)
+            if checkpoint is not None:
+                last_processed_file, rolling_values, processed_count, last_offset = checkpoint
+            else:
+                last_processed_file, rolling_values, _, processed_count, last_offset = parse_log_file(log_file_path)
         else:
             # 自动查找最新的log文件
             latest_log = find_latest_log_file()
             if latest_log:
-                last_processed_file, rolling_values, _, processed_count = parse_log_file(latest_log)
+                last_processed_file, rolling_values, _, processed_count, last_offset = parse_log_file(latest_log)
 
         # 初始化外部评估器
         evaluator = None
@@ -213,20 +402,10 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
         
         if getattr(config, 'USE_EXTERNAL_SEGMENT_EVALUATOR', False):
             try:
-                import importlib.util
-                evaluator_file = getattr(config, 'EXTERNAL_EVALUATOR_FILE')
-                # 将外部工程根目录加入 sys.path
-                project_root = os.path.dirname(evaluator_file)
-                if project_root not in sys.path:
-                    sys.path.insert(0, project_root)
-
-                spec = importlib.util.spec_from_file_location(
-                    "external_evaluator", evaluator_file
+                EvaluatorClass = load_external_evaluator(
+                    getattr(config, 'EXTERNAL_EVALUATOR_FILE'), getattr(config, 'EXTERNAL_EVALUATOR_CLASS')
                 )
-                if spec and spec.loader:
-                    external_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(external_module)
-                    EvaluatorClass = getattr(external_module, getattr(config, 'EXTERNAL_EVALUATOR_CLASS'))
+                if EvaluatorClass is not None:
                     evaluator = EvaluatorClass()
                     used_external_evaluator = True
                     
@@ -242,51 +421,59 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
             print("错误: 外部评估器未启用或加载失败，无法继续。")
             return
 
-        # 确定从哪个文件开始处理
-        start_processing = False
+        use_parsed_cache = getattr(config, 'PARSED_TEXT_CACHE', False)
+        parsed_cache_dir = getattr(config, 'PARSED_TEXT_CACHE_DIR', '.cache')
+        # 确定从哪个文件开始处理：log 中记录了偏移时直接 seek，否则（旧 log）读取时跳过已处理的部分
+        if last_processed_file is not None and last_offset is not None:
+            print(f"从文件 {last_processed_file} 之后开始处理（偏移 {last_offset} 字节）...")
+            text_lines = iter_parsed_lines(text_file_path, start_offset=last_offset, use_cache=use_parsed_cache,
+                                           cache_dir=parsed_cache_dir)
+        elif last_processed_file is not None:
+            print(f"从文件 {last_processed_file} 之后开始处理...")
+            text_lines = iter_parsed_lines(text_file_path, resume_after=last_processed_file, use_cache=use_parsed_cache,
+                                           cache_dir=parsed_cache_dir)
+        else:
+            print("从头开始处理所有文件...")
+            text_lines = iter_parsed_lines(text_file_path, use_cache=use_parsed_cache,
+                                           cache_dir=parsed_cache_dir)
         processed_lines = 0
         
-        for i, line in enumerate(lines):
-            if not line.strip():
-                continue
-            
-            filename, gt_text, _ = process_line_to_ground_truth(line, use_word_comparison=False)
-            if filename is None or not filename:
-                continue
-            
-            # 检查是否应该开始处理
-            if not start_processing:
-                if last_processed_file is None or filename == last_processed_file:
-                    start_processing = True
-                    if last_processed_file is not None:
-                        print(f"从文件 {filename} 之后开始处理...")
-                        continue
-                    else:
-                        print("从头开始处理所有文件...")
-                else:
-                    continue
-            
-            full_audio_path = os.path.join(audio_base_path, filename)
-            if not os.path.exists(full_audio_path):
-                print(f"错误: 音频文件未找到 at {full_audio_path}")
-                continue
-            plain_transcription = re.sub(r'[<>]', '', gt_text)
-            
-            # 调用模型的 process 方法
-            hyp_text = model.process(full_audio_path, plain_transcription)
-
-            print(f"文件: {filename}")
-            print(f"  GT  : {gt_text}")
-            print(f"  HYP : {hyp_text}")
-
-            if evaluator is not None:
-                # try:
-                    # 打印报告；外部评估器内部负责比对【】区间
-                _ = evaluator.print_evaluation_report(gt_text, hyp_text)
-                # except Exception as e:
-                #     print(f"  外部评估器运行失败: {e}")
+        batch_size = getattr(config, 'BATCH_SIZE', 1) or 1
+        # 可选：预先遍历一次音频目录，避免对每个文件单独 stat
+        existing_paths = walk_audio_paths(audio_base_path) if getattr(config, 'PREWALK_AUDIO', False) else None
+        samples = iter_samples(text_lines, audio_base_path, existing_paths)
+        eval_gpus = getattr(config, 'EVAL_GPUS', None)
+        if eval_gpus:
+            # 多进程评估：每块 GPU 一个进程、各自加载模型（此时主进程不加载模型，也不预加载音频）
+            results = run_eval_parallel(iter_batches(samples, batch_size), eval_gpus)
+        else:
+            # 后台线程预加载下一个 batch 的音频，与当前 batch 的推理重叠
+            prefetch_workers = getattr(config, 'PREFETCH_WORKERS', 0)
+            batches = iter_prefetched_batches(iter_batches(samples, batch_size), model.load_audio, prefetch_workers,
+                                              prepare_batch=model.prepare_batch,
+                                              prefetch_depth=getattr(config, 'PREFETCH_DEPTH', 1))
+            # 调用模型的 process_batch 方法，一次推理一个 mini-batch；NUM_WORKERS > 1 时多个 batch 并发推理
+            num_workers = getattr(config, 'NUM_WORKERS', 1) or 1
+            results = iter_process_batches(model, batches, num_workers)
+        for batch, hyp_texts in results:
+            # 结果按输入顺序返回，评估器的统计仍在主线程中依次累加
+            for (offset, filename, gt_text, _, _), hyp_text in zip(batch, hyp_texts):
+                log(f"文件: {filename}")
+                # 记录该行在文本文件中的结束偏移，续接时可直接 seek 到此处
+                log(f"OFFSET: {offset}")
+                log(f"  GT  : {gt_text}")
+                log(f"  HYP : {hyp_text}")
+
+                if evaluator is not None:
+                    # try:
+                        # 打印报告；外部评估器内部负责比对【】区间
+                    _ = evaluator.print_evaluation_report(gt_text, hyp_text)
+                    # except Exception as e:
+                    #     print(f"  外部评估器运行失败: {e}")
             
-            processed_lines += 1
+                processed_lines += 1
+                if log_file_path and evaluator is not None:
+                    save_checkpoint(log_file_path, evaluator, filename, processed_count + processed_lines, offset)
 
         print("-" * 80)
         print(f"处理完成！")
@@ -296,13 +483,18 @@ def run_evaluation_with_checkpoint(model, text_file_path, audio_base_path, log_f
         print("="*80)
         
     finally:
-        # 恢复原始输出
-        if tee_output:
+        # 恢复原始输出，并等待后台线程写完队列中剩余的日志
+        if logger:
+            sys.stdout.flush()
             sys.stdout = original_stdout
-        if log_file:
-            log_file.close()
+        if listener:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
 
 if __name__ == '__main__':
+    # 模型内部的逐样本调试输出（如 step_model）默认只显示 WARNING 以上，可用环境变量 DIALECTIOU_LOGLEVEL=DEBUG 打开
+    logging.basicConfig(level=os.environ.get("DIALECTIOU_LOGLEVEL", "WARNING").upper())
     # 打印配置信息
     config.print_config()
     
@@ -310,10 +502,11 @@ if __name__ == '__main__':
     if not os.path.isdir(config.AUDIO_BASE_PATH):
         print(f"错误: 配置的音频根目录 AUDIO_BASE_PATH 不存在: '{config.AUDIO_BASE_PATH}'")
     else:
-        # 动态加载并实例化模型
-        model_instance = get_model_instance()
+        # 动态加载并实例化模型；EVAL_GPUS 多进程评估时由各工作进程自行加载
+        use_parallel = bool(getattr(config, 'EVAL_GPUS', None))
+        model_instance = None if use_parallel else get_model_instance()
         
-        if model_instance:
+        if model_instance or use_parallel:
             # 自动查找最新的log文件，或使用命令行参数指定的文件
             log_file_path = None
             if len(sys.argv) > 1:
@@ -1,43 +1,16 @@
 # your_project_folder/main.py
 
 import os
-import re
-import importlib
-import sys
+import logging
 
 # 从配置文件导入所有配置
 import config
 
 # 从工具模块导入函数
-from my_utils.text_processing import process_line_to_ground_truth, calculate_text_iou, calculate_word_metrics
-
-def get_model_instance():
-    """动态导入并实例化所选的模型。"""
-    try:
-        model_name = config.SELECTED_MODEL
-        model_config = config.MODEL_CONFIGS[model_name]
-        
-        # 动态地从 models 包中导入对应的模块
-        # 例如，如果 model_name 是 "QwenAudioModel"，则导入 models.qwen_model
-        module_name = model_config['module_name']
-        model_module = importlib.import_module(module_name)
-        
-        # 从模块中获取模型类
-        ModelClass = getattr(model_module, model_name)
-        
-        # 实例化模型
-        print(f"正在实例化模型: {model_name}")
-        instance = ModelClass(
-            device=config.DEVICE,
-            **model_config
-        )
-        return instance
-
-    except (ImportError, KeyError, AttributeError) as e:
-        print(f"错误: 无法加载模型 '{config.SELECTED_MODEL}'。请检查 'config.py' 和 'models' 文件夹。")
-        print(f"详细错误: {e}")
-        return None
-
+from my_utils.runner import get_model_instance, load_external_evaluator, iter_process_batches
+from my_utils.audio_prefetch import iter_prefetched_batches, walk_audio_paths
+from my_utils.parallel_eval import run_eval_parallel
+from my_utils.text_processing import calculate_text_iou, calculate_word_metrics, iter_parsed_lines, iter_batches, iter_samples
 
 def run_evaluation(model, text_file_path, audio_base_path):
     """主评估流程。"""
@@ -47,27 +20,27 @@ def run_evaluation(model, text_file_path, audio_base_path):
     print(f"音频文件根目录: {audio_base_path}")
     print("-" * 80)
 
-    try:
-        with open(text_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
+    # 文本文件在循环中逐行读取，这里只检查是否存在
+    if not os.path.isfile(text_file_path):
         print(f"错误: 文本文件 '{text_file_path}' 未找到。")
         return
 
     used_external_evaluator = False
+    use_parsed_cache = getattr(config, 'PARSED_TEXT_CACHE', False)
+    parsed_cache_dir = getattr(config, 'PARSED_TEXT_CACHE_DIR', '.cache')
 
     if config.USE_WORD_COMPARISON:
+        if model is None:
+            print("错误: 词汇级别比对不支持 EVAL_GPUS 多进程评估，请将 EVAL_GPUS 设为 None。")
+            return
         # 使用词汇级别的比对方法
         total_recall = 0
         total_precision = 0
         total_f1 = 0
         processed_lines = 0
 
-        for i, line in enumerate(lines):
-            if not line.strip():
-                continue
-            
-            filename, transcription, gt_words = process_line_to_ground_truth(line, use_word_comparison=True)
+        for _, (filename, transcription, gt_words) in iter_parsed_lines(
+                text_file_path, use_word_comparison=True, use_cache=use_parsed_cache, cache_dir=parsed_cache_dir):
             if filename is None or not filename:
                 continue
             
@@ -92,20 +65,10 @@ def run_evaluation(model, text_file_path, audio_base_path):
         evaluator = None
         if getattr(config, 'USE_EXTERNAL_SEGMENT_EVALUATOR', False):
             try:
-                import importlib.util
-                evaluator_file = getattr(config, 'EXTERNAL_EVALUATOR_FILE')
-                # 将外部工程根目录加入 sys.path，确保其内部引用可解析（如 import power）
-                project_root = os.path.dirname(evaluator_file)
-                if project_root not in sys.path:
-                    sys.path.insert(0, project_root)
-
-                spec = importlib.util.spec_from_file_location(
-                    "external_evaluator", evaluator_file
+                EvaluatorClass = load_external_evaluator(
+                    getattr(config, 'EXTERNAL_EVALUATOR_FILE'), getattr(config, 'EXTERNAL_EVALUATOR_CLASS')
                 )
-                if spec and spec.loader:
-                    external_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(external_module)
-                    EvaluatorClass = getattr(external_module, getattr(config, 'EXTERNAL_EVALUATOR_CLASS'))
+                if EvaluatorClass is not None:
                     evaluator = EvaluatorClass()
                     used_external_evaluator = True
                 else:
@@ -116,39 +79,44 @@ def run_evaluation(model, text_file_path, audio_base_path):
         total_iou = 0
         processed_lines = 0
 
-        for i, line in enumerate(lines):
-            if not line.strip():
-                continue
-            
-            filename, gt_text, _ = process_line_to_ground_truth(line, use_word_comparison=False)
-            if filename is None or not filename:
-                continue
-            
-            full_audio_path = os.path.join(audio_base_path, filename)
-            if not os.path.exists(full_audio_path):
-                print(f"错误: 音频文件未找到 at {full_audio_path}")
-                continue
-            plain_transcription = re.sub(r'[<>]', '', gt_text)
-            
-            # 调用模型的 process 方法
-            hyp_text = model.process(full_audio_path, plain_transcription)
-
-            print(f"文件: {filename}")
-            print(f"  GT  : {gt_text}")
-            print(f"  HYP : {hyp_text}")
-
-            if evaluator is not None:
-                # try:
-                    # 打印报告；外部评估器内部负责比对【】区间
-                _ = evaluator.print_evaluation_report(gt_text, hyp_text)
-                # except Exception as e:
-                #     print(f"  外部评估器运行失败: {e}")
-            else:
-                # 回退到 IoU
-                iou = calculate_text_iou(gt_text, hyp_text)
-                total_iou += iou
-                print(f"  IoU : {iou:.4f}\n")
-                processed_lines += 1
+        batch_size = getattr(config, 'BATCH_SIZE', 1) or 1
+        # 可选：预先遍历一次音频目录，避免对每个文件单独 stat
+        existing_paths = walk_audio_paths(audio_base_path) if getattr(config, 'PREWALK_AUDIO', False) else None
+        samples = iter_samples(iter_parsed_lines(text_file_path, use_cache=use_parsed_cache, cache_dir=parsed_cache_dir), audio_base_path, existing_paths)
+        eval_gpus = getattr(config, 'EVAL_GPUS', None)
+        if eval_gpus:
+            # 多进程评估：每块 GPU 一个进程、各自加载模型（此时主进程不加载模型，也不预加载音频）
+            results = run_eval_parallel(iter_batches(samples, batch_size), eval_gpus)
+        else:
+            # 后台线程预加载下一个 batch 的音频，与当前 batch 的推理重叠
+            prefetch_workers = getattr(config, 'PREFETCH_WORKERS', 0)
+            batches = iter_prefetched_batches(iter_batches(samples, batch_size), model.load_audio, prefetch_workers,
+                                              prepare_batch=model.prepare_batch,
+                                              prefetch_depth=getattr(config, 'PREFETCH_DEPTH', 1))
+            # 调用模型的 process_batch 方法，一次推理一个 mini-batch；NUM_WORKERS > 1 时多个 batch 并发推理
+            num_workers = getattr(config, 'NUM_WORKERS', 1) or 1
+            results = iter_process_batches(model, batches, num_workers)
+        for batch, hyp_texts in results:
+            # 结果按输入顺序返回，评估器的统计仍在主线程中依次累加
+            for (offset, filename, gt_text, _, _), hyp_text in zip(batch, hyp_texts):
+                print(f"文件: {filename}")
+                # 记录该行在文本文件中的结束偏移，续接时可直接 seek 到此处
+                print(f"OFFSET: {offset}")
+                print(f"  GT  : {gt_text}")
+                print(f"  HYP : {hyp_text}")
+
+                if evaluator is not None:
+                    # try:
+                        # 打印报告；外部评估器内部负责比对【】区间
+                    _ = evaluator.print_evaluation_report(gt_text, hyp_text)
+                    # except Exception as e:
+                    #     print(f"  外部评估器运行失败: {e}")
+                else:
+                    # 回退到 IoU
+                    iou = calculate_text_iou(gt_text, hyp_text)
+                    total_iou += iou
+                    print(f"  IoU : {iou:.4f}\n")
+                    processed_lines += 1
 
         # 仅在 IoU 回退路径下打印平均值
         if evaluator is None and processed_lines > 0:
@@ -181,16 +149,19 @@ def run_evaluation(model, text_file_path, audio_base_path):
 
 
 if __name__ == '__main__':
+    # 模型内部的逐样本调试输出（如 step_model）默认只显示 WARNING 以上，可用环境变量 DIALECTIOU_LOGLEVEL=DEBUG 打开
+    logging.basicConfig(level=os.environ.get("DIALECTIOU_LOGLEVEL", "WARNING").upper())
     # 打印配置信息
     config.print_config()
     # 检查配置的路径
     if not os.path.isdir(config.AUDIO_BASE_PATH):
         print(f"错误: 配置的音频根目录 AUDIO_BASE_PATH 不存在: '{config.AUDIO_BASE_PATH}'")
     else:
-        # 动态加载并实例化模型
-        model_instance = get_model_instance()
+        # 动态加载并实例化模型；EVAL_GPUS 多进程评估时由各工作进程自行加载
+        use_parallel = bool(getattr(config, 'EVAL_GPUS', None))
+        model_instance = None if use_parallel else get_model_instance()
         
-        if model_instance:
+        if model_instance or use_parallel:
             # 如果模型加载成功，则开始评估
             run_evaluation(
                 model=model_instance,
@@ -1,6 +1,7 @@
 # your_project_folder/models/base_model.py
 
 from abc import ABC, abstractmethod
+from typing import List
 
 class MultimodalModel(ABC):
     """
@@ -32,4 +33,77 @@ class MultimodalModel(ABC):
         Returns:
             str: 模型生成的、带有标记的预测文本。
         """
-        pass
\ No newline at end of file
+        pass
+
+    def load_audio(self, audio_path: str):
+        """
+        预先加载音频数据，供 process_tensor / process_batch 使用。
+
+        评估脚本会在后台线程中调用此方法，使音频读取与模型推理重叠。
+        默认返回 None，表示该模型不支持预加载，由 process 自行读取音频。
+
+        Args:
+            audio_path (str): 音频文件的绝对路径。
+
+        Returns:
+            已加载的音频数据；不支持预加载时为 None。
+        """
+        return None
+
+    def prepare_batch(self, audio_paths: List[str], audios: list):
+        """
+        在后台线程中对一个 batch 做推理前的 CPU 预处理（如特征提取、分词），
+        使其与上一个 batch 的推理重叠；结果通过 prepared 参数传给 process_batch。
+
+        默认不做预处理，返回 None（此时不会向 process_batch 传递 prepared）。
+        """
+        return None
+
+    def process_tensor(self, audio_path: str, audio_data, transcription: str) -> str:
+        """
+        使用 load_audio 预先加载的音频数据处理单个样本。
+
+        默认实现忽略 audio_data，直接调用 process。
+        """
+        return self.process(audio_path, transcription)
+
+    def process_batch(self, audio_paths: List[str], transcriptions: List[str], audios: list = None) -> List[str]:
+        """
+        批量处理多个音频和文本对。
+
+        默认实现逐个调用 process（提供了预加载音频时调用 process_tensor）；
+        子类可覆盖此方法，将多个样本合并为一次批量推理。
+
+        Args:
+            audio_paths (List[str]): 音频文件的绝对路径列表。
+            transcriptions (List[str]): 与 audio_paths 一一对应的纯文本转写。
+            audios (list): 可选，load_audio 预加载的音频数据，元素为 None 表示未预加载。
+
+        Returns:
+            List[str]: 与输入一一对应的预测文本。
+        """
+        if audios is None:
+            return [self.process(audio_path, transcription)
+                    for audio_path, transcription in zip(audio_paths, transcriptions)]
+        return [self.process_tensor(audio_path, audio_data, transcription) if audio_data is not None
+                else self.process(audio_path, transcription)
+                for audio_path, transcription, audio_data in zip(audio_paths, transcriptions, audios)]
+
+    def answer_batch(self, audio_path: str, questions: List[str], options_list: List[list], dialect_explanations: str = None) -> List[str]:
+        """
+        针对同一条音频回答多个问题。
+
+        默认实现逐题调用 answer；子类可覆盖此方法，使同一音频的读取/编码只做一次。
+
+        Args:
+            audio_path (str): 音频文件的绝对路径。
+            questions (List[str]): 问题列表。
+            options_list (List[list]): 与 questions 一一对应的选项列表。
+            dialect_explanations (str): 可选的方言解释。
+
+        Returns:
+            List[str]: 与 questions 一一对应的答案字母。
+        """
+        kwargs = {"dialect_explanations": dialect_explanations} if dialect_explanations else {}
+        return [self.answer(audio_path, question, options, **kwargs)
+                for question, options in zip(questions, options_list)]
\ No newline at end of file
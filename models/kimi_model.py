@@ -3,12 +3,12 @@ import sys
 import re
 from .base_model import MultimodalModel
 from my_utils.text_processing import mark_words_in_text
+from my_utils.response_cache import make_cache_key, open_response_cache, file_sha256
+from my_utils.lexicon import load_lexicon_matcher, load_basic_vocab, is_trivial_text
 import config
 
-# Get kimi_root_path from config
-kimi_root_path = config.MODEL_CONFIGS["KimiAudioModel"]["kimi_root_path"]
-sys.path.append(kimi_root_path)
-from kimia_infer.api.kimia import KimiAudio
+# 模型返回的方言词以中英文逗号分隔
+_SPLIT_RE = re.compile(r"[,，]")
 
 class KimiAudioModel(MultimodalModel):
     """
@@ -26,6 +26,12 @@ class KimiAudioModel(MultimodalModel):
             device (str): 此模型未使用，kimia_infer 内部处理设备。
             **kwargs: 用于接收额外的配置，如此处的 sampling_params。
         """
+        # kimia_infer 在此处才导入：只使用其他模型时不必把 Kimi 仓库加入 sys.path、也不加载 torch 等依赖
+        kimi_root_path = config.MODEL_CONFIGS["KimiAudioModel"]["kimi_root_path"]
+        if kimi_root_path not in sys.path:
+            sys.path.append(kimi_root_path)
+        from kimia_infer.api.kimia import KimiAudio
+
         model_path = f"{kimi_root_path}/{model_path}"
         print("="*50)
         print(f"正在从 '{model_path}' 加载 Kimi-Audio 模型...")
@@ -38,6 +44,14 @@ class KimiAudioModel(MultimodalModel):
             )
             # 从 kwargs 获取采样参数，如果没有提供则使用空字典
             self.sampling_params = kwargs.get("sampling_params", {})
+            self._model_path = model_path
+            # 可选：缓存生成结果，重复运行时相同的 提示词+音频+采样参数 不再调用 generate
+            self._response_cache = open_response_cache(kwargs, "kimi")
+            # 可选：方言词表预筛，ASR 文本中命中不少于 lexicon_min_matches 个词表词时跳过阶段二
+            self._lexicon_matcher = load_lexicon_matcher(kwargs)
+            self._lexicon_min_matches = max(1, int(kwargs.get("lexicon_min_matches", 1)))
+            # 可选：常用字表，ASR 文本全部由常用字组成时视为没有方言词
+            self._basic_vocab = load_basic_vocab(kwargs)
             print("Kimi-Audio 模型加载成功！")
             if self.sampling_params:
                 print("已加载以下采样参数:")
@@ -49,6 +63,30 @@ class KimiAudioModel(MultimodalModel):
             raise e
         print("="*50)
 
+    def _generate_text(self, messages: list, audio_path: str, use_cache: bool = True) -> str:
+        """
+        调用 self.model.generate 生成文本；启用缓存且 use_cache 为真时先按 模型+消息+音频内容+生成参数 查找缓存。
+        缓存只用于 process 的 ASR 与方言词提取两个阶段，answer 每次都重新生成。
+        """
+        cache_key = None
+        if self._response_cache is not None and use_cache:
+            # 以音频内容的哈希代替路径：音频被替换后缓存自动失效，改名或移动后仍能命中
+            text_messages = [m for m in messages if m["message_type"] != "audio"]
+            cache_key = make_cache_key(self._model_path, text_messages, file_sha256(audio_path),
+                                       self.sampling_params, "text")
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        _wav, text = self.model.generate(
+            messages,
+            **self.sampling_params,
+            output_type="text"
+        )
+        if cache_key is not None and text:
+            self._response_cache.set(cache_key, text)
+        return text
+
     def process(self, audio_path: str, transcription: str) -> str:
         """
         两阶段流程：
@@ -66,14 +104,19 @@ class KimiAudioModel(MultimodalModel):
             {"role": "user", "message_type": "text", "content": "请将接下来提供的音频内容转写为中文，不要添加任何额外说明。"},
             {"role": "user", "message_type": "audio", "content": audio_path},
         ]
-        _wav, asr_text = self.model.generate(
-            asr_messages,
-            **self.sampling_params,
-            output_type="text"
-        )
+        asr_text = self._generate_text(asr_messages, audio_path)
         if not asr_text:
             asr_text = transcription or ""
 
+        # ASR 文本为空（或全为常用字）时不含方言词，无需阶段二
+        if is_trivial_text(asr_text, self._basic_vocab):
+            return mark_words_in_text(asr_text, [])
+
+        if self._lexicon_matcher is not None:
+            lexicon_words = self._lexicon_matcher(asr_text)
+            if len(lexicon_words) >= self._lexicon_min_matches:
+                return mark_words_in_text(asr_text, lexicon_words)
+
         # --- 阶段二：提取方言特有词汇（逗号分隔）---
         extract_messages = [
             {"role": "user", "message_type": "text", "content": """对于方言音频以及给定的转写成的文字，找出其中所有的方言特有表达词汇，并用逗号隔开，不用输出其他内容，注意有的方言表达是没有汉字对应的拟声词
@@ -88,14 +131,10 @@ class KimiAudioModel(MultimodalModel):
             
         ]
         # import pdb; pdb.set_trace()
-        _wav, dialect_words_text = self.model.generate(
-            extract_messages,
-            **self.sampling_params,
-            output_type="text"
-        )
+        dialect_words_text = self._generate_text(extract_messages, audio_path)
 
         # --- 阶段三：在 ASR 文本中标记方言词 ---
-        dialect_words = [w.strip() for w in re.split(r"[,，]", dialect_words_text or "") if w.strip()]
+        dialect_words = [w.strip() for w in _SPLIT_RE.split(dialect_words_text or "") if w.strip()]
         marked_text = mark_words_in_text(asr_text, dialect_words)
         return marked_text
 
@@ -135,11 +174,7 @@ class KimiAudioModel(MultimodalModel):
             {"role": "user", "message_type": "audio", "content": audio_path},
         ]
         
-        _wav, answer_text = self.model.generate(
-            messages,
-            **self.sampling_params,
-            output_type="text"
-        )
+        answer_text = self._generate_text(messages, audio_path, use_cache=False)
         
         # 从回答中提取答案字母
         if answer_text:
@@ -4,20 +4,62 @@ import os
 import requests
 import json
 import getpass
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import librosa
 import numpy as np
 
+try:
+    # 可选依赖：从系统钥匙串读取 API Key
+    import keyring
+except ImportError:
+    keyring = None
+
 # Local imports from our project structure
 from .base_model import MultimodalModel
+from my_utils.response_cache import make_cache_key, open_response_cache
+from my_utils.audio_io import load_audio
+
+# funasr 的 Paraformer 模型要求 16kHz 输入；传入预加载的波形数组时按此采样率解释
+_PARAFORMER_SR = 16000
+
+# 批量请求时解析 LLM 按序号逐行返回的结果，如 "1. 三不孜儿地，门子"
+# 只允许行内空白（[ \t]），否则空的序号行会把下一行的内容当作自己的结果
+_NUMBERED_LINE_RE = re.compile(r"^[ \t]*(\d+)[ \t]*[.\uFF0E、][ \t]*(.*)$", flags=re.M)
+
+
+def _parse_numbered_lines(response: str) -> dict:
+    r"""
+    解析按序号逐行返回的结果，返回 {序号: 内容}；同一序号只取第一次出现，空行的内容为空字符串。
+
+    >>> _parse_numbered_lines("1. 甲,乙\n2.\n3. 丙")
+    {1: '甲,乙', 2: '', 3: '丙'}
+    """
+    answers = {}
+    for number, content in _NUMBERED_LINE_RE.findall(response):
+        answers.setdefault(int(number), content.strip())
+    return answers
+
+# 模型返回的方言词以中英文逗号分隔
+_SPLIT_RE = re.compile(r"[,，]")
 
 # --- Module-level cache for the API key ---
 _API_KEY_CACHE = None
 
 def _get_api_key(api_key_name: str):
     """
-    Securely prompts the user for an API key once and caches it for the session.
+    Looks up the API key once and caches it for the session:
+    the LLM_API_KEY environment variable, then the system keyring
+    (service "dialectiou", username api_key_name), then an interactive prompt.
     """
     global _API_KEY_CACHE
+    if _API_KEY_CACHE is None:
+        _API_KEY_CACHE = os.environ.get("LLM_API_KEY") or None
+    if _API_KEY_CACHE is None and keyring is not None:
+        try:
+            _API_KEY_CACHE = keyring.get_password("dialectiou", api_key_name)
+        except Exception as e:
+            print(f"无法从钥匙串读取 API Key: {e}")
     if _API_KEY_CACHE is None:
         try:
             print("-" * 60)
@@ -31,6 +73,27 @@ def _get_api_key(api_key_name: str):
     return _API_KEY_CACHE
 
 
+class _OnnxParaformer:
+    """
+    用 funasr_onnx（ONNX Runtime，可选 int8 量化模型）运行 Paraformer，
+    对外提供与 funasr AutoModel 相同的 generate(input=..., batch_size_s=...) 接口。
+    """
+    def __init__(self, model_dir: str, quantize: bool, batch_size: int):
+        from funasr_onnx import Paraformer
+        # CPU 推理：使用一半的逻辑核心，避免与数据加载等线程争抢
+        self.model = Paraformer(model_dir, batch_size=batch_size, quantize=quantize,
+                                intra_op_num_threads=max(1, (os.cpu_count() or 2) // 2))
+
+    def generate(self, input, batch_size_s=None):
+        results = self.model(input if isinstance(input, list) else [input])
+        texts = []
+        for item in results:
+            preds = item.get("preds", "") if isinstance(item, dict) else item
+            # 不同版本的 funasr_onnx 返回 文本 或 (文本, token 列表)
+            texts.append({"text": preds[0] if isinstance(preds, (list, tuple)) else preds})
+        return texts
+
+
 class ParaformerLlmApiModel(MultimodalModel):
     """
     一个两阶段模型：
@@ -50,16 +113,32 @@ class ParaformerLlmApiModel(MultimodalModel):
         
         # --- 1. 初始化 funasr ---
         self.paraformer_model = None
+        # 本地 funasr 推理串行执行，允许多个线程并发调用远程 LLM API
+        self._asr_lock = threading.Lock()
         funasr_model_path = kwargs.get("model_path")
         if not funasr_model_path:
             raise ValueError("配置错误: ParaformerLlmApiModel 需要 'funasr_model_path'。")
             
+        # 可选：ONNX Runtime 推理（use_onnx 或模型路径指向 .onnx 文件时），CPU 上可使用 int8 量化模型
+        use_onnx = kwargs.get("use_onnx", False) or funasr_model_path.endswith(".onnx")
+        self._use_onnx = use_onnx
         try:
-            from funasr import AutoModel
-            self.paraformer_model = AutoModel(model=funasr_model_path, device=device)
-            print(f"funasr 模型 '{funasr_model_path}' 加载成功！")
+            if use_onnx:
+                model_dir = os.path.dirname(funasr_model_path) if funasr_model_path.endswith(".onnx") else funasr_model_path
+                quantize = kwargs.get("onnx_quantize", True)
+                self.paraformer_model = _OnnxParaformer(model_dir, quantize, kwargs.get("onnx_batch_size", 8))
+                print(f"funasr ONNX 模型 '{model_dir}' 加载成功！（int8 量化: {quantize}）")
+            else:
+                from funasr import AutoModel
+                # 可选：单独指定 VAD / 标点模型（如 "fsmn-vad"、"ct-punc"），组成 VAD+ASR+PUNC 流水线
+                pipeline_kwargs = {name: kwargs[name] for name in ("vad_model", "punc_model") if kwargs.get(name)}
+                self.paraformer_model = AutoModel(model=funasr_model_path, device=device, **pipeline_kwargs)
+                print(f"funasr 模型 '{funasr_model_path}' 加载成功！")
         except ImportError:
-            print("错误: 未找到 'funasr' 库。请先执行 'pip install funasr'。")
+            if use_onnx:
+                print("错误: 未找到 'funasr_onnx' 库。请先执行 'pip install funasr-onnx'。")
+            else:
+                print("错误: 未找到 'funasr' 库。请先执行 'pip install funasr'。")
             raise
         except Exception as e:
             print(f"错误: funasr 模型加载失败: {e}")
@@ -79,6 +158,20 @@ class ParaformerLlmApiModel(MultimodalModel):
 {transcription}
 
 输出：
+"""
+        # 多条转写合并为一次请求时使用的提示词，{numbered_transcriptions} 为带序号的多行输入
+        self.llm_batch_prompt_template = \
+"""对于方言音频以及给定的转写成的文字，找出其中所有的方言特有表达词汇，并用逗号隔开，不用输出其他内容，注意有的方言表达是没有汉字对应的拟声词
+下面有多条带序号的输入，请对每一条分别输出结果，每条结果单独占一行并以相同的序号开头，没有方言词汇时序号后留空
+案例输入：
+1. 你三不孜儿地看下停电短信息，是不是门子跳了
+案例输出：
+1. 三不孜儿地，门子
+
+输入：
+{numbered_transcriptions}
+
+输出（对应序号）：
 """
         self.llm_input_source = kwargs.get("llm_input_source", "gt").lower() # 默认使用 'gt'
         
@@ -87,56 +180,148 @@ class ParaformerLlmApiModel(MultimodalModel):
         
         print(f"LLM API 配置加载成功 (模型: {self.llm_model_name}, 输入源: {self.llm_input_source.upper()})")
         
+        # 可选：缓存 LLM 返回结果，相同的模型+提示词直接复用，不再发起请求
+        self._response_cache = open_response_cache(kwargs, "llm_api")
+        # process_batch 中并发请求 LLM API 的线程数
+        self.llm_concurrency = max(1, int(kwargs.get("llm_concurrency", 4)))
+        # 每次 LLM 请求合并的转写条数，固定的指令部分只需发送一次
+        self.llm_batch_size = max(1, int(kwargs.get("llm_batch_size", 8)))
+        # 每个线程复用自己的 requests.Session（keep-alive），避免每次请求重新建立 TCP+TLS 连接
+        self._session_local = threading.local()
+        # 请求 LLM API 的线程池在模型生命周期内复用，各线程的 Session 及其连接得以保留
+        self._llm_pool = ThreadPoolExecutor(max_workers=self.llm_concurrency)
+        
         # --- 3. 获取并缓存 API Key ---
         self.api_key = _get_api_key(self.llm_model_name)
         if not self.api_key:
             raise ValueError("未能获取 API Key，无法继续。")
 
+        # 在后台提前完成各请求线程的 DNS 解析与 TLS 握手，首次调用 LLM 时不再等待建立连接
+        for _ in range(self.llm_concurrency):
+            self._llm_pool.submit(self._warm_up_connection)
+
         print("ParaformerLlmApiModel 初始化完成！")
         print("="*50)
 
 
     def _run_paraformer(self, audio_path: str) -> str:
         """使用 funasr 对单个音频文件进行转写。"""
+        return self._run_paraformer_batch([audio_path])[0]
+
+    def _run_paraformer_batch(self, audio_paths: list, audios: list = None) -> list:
+        """
+        使用 funasr 一次转写多个音频文件（列表输入，由 funasr 按 batch_size_s 组批推理），结果按输入顺序返回。
+        audios 中已预加载的波形直接交给 funasr，不再由其重新读取文件；元素为 None 时仍传入路径。
+        批量推理失败或返回条数不符时逐个文件重试，使单个坏文件不影响其他文件。
+        """
         if not self.paraformer_model:
-            return "[paraformer失败: 模型未加载]"
-        try:
-            # 使用 librosa 加载音频，与之前模型保持一致
-            # audio_data, sample_rate = librosa.load(audio_path, sr=16000) # funasr 通常使用 16kHz
-            
-            # funasr 的 generate 方法需要的是 numpy 数组
-            res = self.paraformer_model.generate(input=audio_path, batch_size_s=300,
-                                 output_dir="./output")
-            
-            # 提取文本结果
-            paraformer_text = res[0].get("text", "").replace(" ", "")
-            return paraformer_text if paraformer_text else "[paraformer失败: 未返回文本]"
+            return ["[paraformer失败: 模型未加载]"] * len(audio_paths)
+        if audios is None:
+            audios = [None] * len(audio_paths)
+        inputs = [audio if audio is not None else audio_path for audio_path, audio in zip(audio_paths, audios)]
+        if len(audio_paths) > 1:
+            try:
+                with self._asr_lock:
+                    res = self.paraformer_model.generate(input=inputs, batch_size_s=300)
+                if len(res) == len(audio_paths):
+                    return [self._paraformer_text(item) for item in res]
+            except Exception as e:
+                print(f"funasr 批量转写失败，改为逐个文件转写: {e}")
+        return [self._run_paraformer_one(audio_path, audio_input)
+                for audio_path, audio_input in zip(audio_paths, inputs)]
 
+    def _run_paraformer_one(self, audio_path: str, audio_input=None) -> str:
+        try:
+            with self._asr_lock:
+                res = self.paraformer_model.generate(input=audio_path if audio_input is None else audio_input,
+                                                     batch_size_s=300)
+            return self._paraformer_text(res[0])
         except Exception as e:
             print(f"funasr 在处理 {os.path.basename(audio_path)} 时发生错误: {e}")
             return f"[paraformer失败: {e}]"
 
+    @staticmethod
+    def _paraformer_text(item: dict) -> str:
+        """提取 funasr 单条结果中的文本"""
+        paraformer_text = item.get("text", "").replace(" ", "")
+        return paraformer_text if paraformer_text else "[paraformer失败: 未返回文本]"
+
+
+    def _get_session(self) -> requests.Session:
+        """返回当前线程的 Session；首次调用时创建并设置认证头"""
+        session = getattr(self._session_local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            })
+            self._session_local.session = session
+        return session
+
+    def _warm_up_connection(self):
+        """向 LLM 服务发送一次 OPTIONS 请求以建立连接；失败不影响后续的正常请求"""
+        try:
+            self._get_session().options(self.llm_api_url, timeout=10)
+        except requests.exceptions.RequestException:
+            pass
 
-    def _call_llm_api(self, text_to_process: str) -> str:
+    def _call_llm_api(self, text_to_process: str, use_cache: bool = True) -> str:
         """调用远程 LLM API 进行区间检测。"""
-        prompt = self.llm_prompt_template.format(transcription=text_to_process)
+        return self._request_llm(self.llm_prompt_template.format(transcription=text_to_process), use_cache=use_cache)
+
+    def _call_llm_api_batch(self, texts: list) -> list:
+        """
+        将多条转写按序号合并为一次 LLM 请求，解析按序号返回的结果；
+        单条时直接使用原提示词。某条结果缺失时（如 LLM 漏掉序号或请求失败）单独重新请求该条。
+        """
+        if len(texts) == 1:
+            return [self._call_llm_api(texts[0])]
+
+        numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, 1))
+        response = self._request_llm(self.llm_batch_prompt_template.format(numbered_transcriptions=numbered),
+                                     strip_newlines=False)
+        answers = _parse_numbered_lines(response)
+
+        results = []
+        for i, text in enumerate(texts, 1):
+            if i in answers:
+                results.append(answers[i] or "[LLM返回空内容]")
+            else:
+                results.append(self._call_llm_api(text))
+        return results
+
+    def _request_llm(self, prompt: str, strip_newlines: bool = True, use_cache: bool = True) -> str:
+        """
+        发送单个提示词到远程 LLM API，返回回复文本；出错时返回以 [LLM 开头的错误信息。
+        use_cache 为假时不读写结果缓存（answer 每次都重新请求，与 KimiAudioModel 一致）。
+        """
         payload = {
             "model": self.llm_model_name,
             "messages": [{"role": "user", "content": prompt}]
         }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        cache_key = None
+        if self._response_cache is not None and use_cache:
+            cache_key = make_cache_key(self.llm_api_url, self.llm_model_name, prompt)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
         try:
-            response = requests.post(self.llm_api_url, json=payload, headers=headers, timeout=300)
+            response = self._get_session().post(self.llm_api_url, json=payload, timeout=300)
             response.raise_for_status() # 如果状态码不是 2xx，则抛出异常
             result = response.json()
 
             if result.get("choices") and result["choices"][0].get("message"):
-                fused_text = result["choices"][0]["message"].get("content", "").replace('\n',"")
-                return fused_text if fused_text else "[LLM返回空内容]"
+                fused_text = result["choices"][0]["message"].get("content", "")
+                if strip_newlines:
+                    fused_text = fused_text.replace('\n',"")
+                if not fused_text:
+                    return "[LLM返回空内容]"
+                # 只缓存正常返回的结果，错误信息不写入缓存
+                if cache_key is not None:
+                    self._response_cache.set(cache_key, fused_text)
+                return fused_text
             else:
                 return f"[LLM返回格式错误: {response.text}]"
         except requests.exceptions.RequestException as e:
@@ -144,51 +329,97 @@ class ParaformerLlmApiModel(MultimodalModel):
         except Exception as e:
             return f"[LLM未知错误: {e}]"
 
+    def load_audio(self, audio_path: str):
+        """
+        在后台线程中预先读取并重采样音频（soundfile 解码），funasr 直接使用波形数组。
+        LLM 输入源为 Ground Truth 时不需要音频；funasr_onnx 的列表输入只接受文件路径，也不预加载。
+        """
+        if self.llm_input_source != 'paraformer' or self._use_onnx or not os.path.exists(audio_path):
+            return None
+        return load_audio(audio_path, _PARAFORMER_SR)
+
     def process(self, audio_path: str, transcription: str) -> str:
         """
         执行完整的 paraformer -> LLM 流水线。
         """
+        return self.process_batch([audio_path], [transcription])[0]
+
+    def _texts_for_llm(self, audio_paths: list, transcriptions: list, audios: list = None) -> list:
+        """决定 LLM 的输入文本：paraformer 识别结果或 Ground Truth 转写"""
         # --- 决定 LLM 的输入文本 ---
         if self.llm_input_source == 'paraformer':
             # 如果选择 paraformer 作为输入源，先运行 paraformer
             print(f"  -> 正在运行 funasr...")
-            text_for_llm = self._run_paraformer(audio_path)
-            print(f"  -> funasr 结果: {text_for_llm}")
+            texts_for_llm = self._run_paraformer_batch(audio_paths, audios)
+            for text_for_llm in texts_for_llm:
+                print(f"  -> funasr 结果: {text_for_llm}")
         else:
             # 否则，直接使用 Ground Truth 文本
-            text_for_llm = transcription
-
-        # --- 调用 LLM API ---
-        print(f"  -> 正在调用 LLM API...")
-        final_text = self._call_llm_api(text_for_llm)
+            texts_for_llm = list(transcriptions)
+        return texts_for_llm
 
+    def _mark_dialect_words(self, text_for_llm: str, final_text: str) -> str:
+        """在 LLM 的输入文本中标记 LLM 返回的方言词汇"""
         # --- 后处理，提取方言词汇并用【】标记在原文本中 ---
         if final_text:
             # 1. 用正则提取出final_text中所有被"," 或"，"分隔开的词
             from my_utils.text_processing import mark_words_in_text
             
-            dialect_words = [word.strip() for word in re.split(r'[,，]', final_text) if word.strip()]
+            dialect_words = [word.strip() for word in _SPLIT_RE.split(final_text) if word.strip()]
             final_text = mark_words_in_text(text_for_llm, dialect_words)
             
         return final_text
 
+    def process_batch(self, audio_paths: list, transcriptions: list, audios: list = None) -> list:
+        """
+        批量处理：每 llm_batch_size 条转写合并为一次 LLM 请求。
+        funasr 在当前线程中逐组运行，已准备好的组随即提交到线程池发起请求，使 ASR 与 LLM 请求重叠。
+        """
+        k = self.llm_batch_size
+        if audios is None:
+            audios = [None] * len(audio_paths)
+        groups = [(audio_paths[i:i + k], transcriptions[i:i + k], audios[i:i + k]) for i in range(0, len(audio_paths), k)]
+        texts_for_llm = []
+        final_texts = []
+        futures = []
+        for group_paths, group_transcriptions, group_audios in groups:
+            group_texts = self._texts_for_llm(group_paths, group_transcriptions, group_audios)
+            texts_for_llm.extend(group_texts)
+            print(f"  -> 正在调用 LLM API...")
+            futures.append(self._llm_pool.submit(self._call_llm_api_batch, group_texts))
+        for future in futures:
+            final_texts.extend(future.result())
+        return [self._mark_dialect_words(text_for_llm, final_text)
+                for text_for_llm, final_text in zip(texts_for_llm, final_texts)]
+
     def answer(self, audio_path: str, question: str, options: list, dialect_explanations: str = None) -> str:
         """
         回答问题流程：
         1) 使用Paraformer进行ASR，得到识别文本asr_text；
         2) 将问题、选项和ASR文本结合，调用LLM API生成答案。
         """
+        return self.answer_batch(audio_path, [question], [options], dialect_explanations)[0]
+
+    def answer_batch(self, audio_path: str, questions: list, options_list: list, dialect_explanations: str = None) -> list:
+        """
+        同一音频的多个问题只运行一次 Paraformer ASR，再逐题调用 LLM API。
+        """
         if not os.path.exists(audio_path):
             print(f"错误: 音频文件未找到 at {audio_path}")
-            return "E"  # 返回错误标记
+            return ["E"] * len(questions)  # 返回错误标记
 
-        # 构建选项文本
-        options_text = "\n".join([option for option in options])
-        
         # 第一步：使用Paraformer进行ASR
         print(f"  -> 正在运行 funasr ASR...")
         asr_text = self._run_paraformer(audio_path)
         print(f"  -> ASR 结果: {asr_text}")
+
+        return [self._answer_from_asr(asr_text, question, options, dialect_explanations)
+                for question, options in zip(questions, options_list)]
+
+    def _answer_from_asr(self, asr_text: str, question: str, options: list, dialect_explanations: str = None) -> str:
+        """基于已有的 ASR 文本构建提示词并调用 LLM API 回答单个问题。"""
+        # 构建选项文本
+        options_text = "\n".join([option for option in options])
         
         # 第二步：构建提示词，调用LLM API
         prompt = f"""请根据音频转写文本和问题，选择正确的答案。
@@ -206,7 +437,7 @@ class ParaformerLlmApiModel(MultimodalModel):
         
         # 调用LLM API
         print(f"  -> 正在调用 LLM API 回答问题...")
-        answer_text = self._call_llm_api(prompt)
+        answer_text = self._call_llm_api(prompt, use_cache=False)
         
         # 从回答中提取答案字母
         if answer_text:
@@ -1,12 +1,52 @@
 # your_project_folder/models/qwen_model.py
 
 import os
+import importlib.util
 import torch
-import librosa
 import re
-from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
+from concurrent.futures import ThreadPoolExecutor
 from .base_model import MultimodalModel # 从同一目录下的 base_model 导入基类
 from my_utils.text_processing import mark_words_in_text
+from my_utils.audio_io import load_audio
+from my_utils.response_cache import make_cache_key, open_response_cache, file_sha256
+from my_utils.lexicon import load_lexicon_matcher, load_basic_vocab, is_trivial_text
+
+# 阶段二提示词中 ASR 文本所在位置的占位标记，用于预先渲染对话模板
+_ASR_TEXT_SENTINEL = "{__ASRTEXT__}"
+
+# 模型返回的方言词以中英文逗号分隔
+_SPLIT_RE = re.compile(r"[,，]")
+
+def _extract_conversation(asr_text_: str) -> list:
+    """阶段二（提取方言特有词汇）的对话"""
+    return [
+        {"role": "system", "content": [
+            {"type": "text", "text": f"""Audio 1: <|audio_bos|><|AUDIO|><|audio_eos|>\n {asr_text_} Extract all dialect-specific words from the speech, and separate them with commas. Do not include any other content. \n Example output: \n汾波, 门子\n """},
+        ]},
+    ]
+
+def _select_attn_implementation(requested: str, on_cuda: bool) -> str:
+    """flash_attention_2 需要 CUDA 且已安装 flash-attn，否则回退到 PyTorch 自带的 sdpa"""
+    if requested == "flash_attention_2" and not (on_cuda and importlib.util.find_spec("flash_attn")):
+        print("提示: 未安装 flash-attn 或未使用 CUDA，注意力实现回退为 sdpa")
+        return "sdpa"
+    return requested
+
+def _load_vllm_engine(model_path: str, dtype: str, kwargs: dict):
+    """可选：用 vLLM（分页 KV cache、连续批处理）加载模型；未安装 vllm 时返回 None，回退到 transformers"""
+    try:
+        from vllm import LLM, SamplingParams
+    except ImportError:
+        print("警告: 未安装 vllm，回退为使用 transformers 推理")
+        return None
+    engine = LLM(
+        model=model_path,
+        dtype=dtype,
+        gpu_memory_utilization=kwargs.get("gpu_memory_utilization", 0.9),
+        limit_mm_per_prompt={"audio": 1},
+    )
+    print("已使用 vLLM 加载模型")
+    return engine, SamplingParams
 
 class QwenAudioModel(MultimodalModel):
     """Qwen2-Audio-7B-Instruct 模型的具体实现。"""
@@ -19,16 +59,111 @@ class QwenAudioModel(MultimodalModel):
         print(f"正在从 '{model_path}' 加载 Qwen 模型和处理器...")
         print(f"将使用设备: {device}")
         
+        # transformers 在此处才导入，导入本模块（如只用到其中的工具函数）时不必付出其启动开销
+        from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
+
         try:
+            on_cuda = torch.cuda.is_available() and str(device).startswith("cuda")
+            # GPU 上默认以 bfloat16 加载（权重读写量减半）；CPU 上保持 float32
+            self._dtype = getattr(torch, kwargs.get("torch_dtype", "bfloat16")) if on_cuda else torch.float32
+            attn_implementation = _select_attn_implementation(kwargs.get("attn_implementation", "sdpa"), on_cuda)
             self.processor = AutoProcessor.from_pretrained(processor_path)
-            self.model = Qwen2AudioForConditionalGeneration.from_pretrained(model_path, device_map=device)
+            # use_vllm 为 True 时由 vLLM 负责生成，处理器仍用于构造提示词
+            self._engine = None
+            if kwargs.get("use_vllm", False):
+                self._engine = _load_vllm_engine(model_path, kwargs.get("torch_dtype", "bfloat16"), kwargs)
+            if self._engine is not None:
+                self.model = None
+            else:
+                self.model = Qwen2AudioForConditionalGeneration.from_pretrained(
+                    model_path, torch_dtype=self._dtype, device_map=device, attn_implementation=attn_implementation
+                )
+                self.model.eval()
+                # 只做推理：关闭参数的梯度记录，并确保生成时使用 KV 缓存（部分权重的 config 中默认关闭）
+                self.model.requires_grad_(False)
+                self.model.config.use_cache = True
+                self.model.generation_config.use_cache = True
+            if self.model is not None and kwargs.get("compile", False):
+                # 只编译 forward：generate 内部逐步调用的正是它；首次调用时会有较长的编译耗时
+                self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=False)
+                print("已启用 torch.compile (mode=reduce-overhead)")
+            # 批量生成时需在左侧补齐，保证各样本的生成部分都从同一位置开始
+            self.processor.tokenizer.padding_side = "left"
+            # 处理器要求的采样率，读取音频时重采样到该值
+            self._target_sr = self.processor.feature_extractor.sampling_rate
+            # 提示词中音频占位符及其 token id，阶段二复用音频特征时用于按样本展开占位符
+            self._audio_token = getattr(self.processor, "audio_token", "<|AUDIO|>")
+            self._audio_token_id = self.processor.tokenizer.convert_tokens_to_ids(self._audio_token)
+            # 音频编码器的输出在两个阶段间复用：自行编码一次音频并以 inputs_embeds 调用 generate
+            self._reuse_audio_embeds = kwargs.get("reuse_audio_embeds", True)
             self.device = device
+            # GPU 推理时把 CPU 输入放入锁页内存，使拷贝到显存可以异步进行（non_blocking）
+            self._pin_memory = on_cuda
+            # prepare_batch 在独立的 CUDA 流上把下一个 batch 拷贝到显存，与当前 batch 在默认流上的推理重叠
+            self._h2d_stream = torch.cuda.Stream(device=device) if on_cuda and kwargs.get("h2d_stream", True) else None
+            # 单次 generate 的最大样本数；更大的 batch 会被拆分，避免显存不足
+            self.max_batch_size = max(1, int(kwargs.get("max_batch_size", 8)))
+            # 阶段一（ASR）的提示词对所有样本相同，只需生成一次
+            asr_conversation = [
+                {"role": "user", "content": "Audio 1: <|audio_bos|><|AUDIO|><|audio_eos|>\n Transcribe the speech to texts"},
+            ]
+            self._asr_text_template = self.processor.apply_chat_template(asr_conversation, add_generation_prompt=True, tokenize=False)
+            # 阶段二的模板只有 ASR 文本不同：用占位标记渲染一次，之后直接拼接前后缀
+            rendered = self.processor.apply_chat_template(_extract_conversation(_ASR_TEXT_SENTINEL),
+                                                          add_generation_prompt=True, tokenize=False)
+            if rendered.count(_ASR_TEXT_SENTINEL) == 1:
+                self._extract_prefix, self._extract_suffix = rendered.split(_ASR_TEXT_SENTINEL)
+            else:
+                self._extract_prefix = self._extract_suffix = None
+            # 阶段二模板中固定部分的 token id 只计算一次，运行时只需对 ASR 文本分词
+            self._extract_ids = self._pretokenize_extract_template()
+            # 可选：按音频内容缓存阶段一的 ASR 结果，只修改阶段二提示词重新实验时不必重跑 ASR
+            self._model_path = model_path
+            self._asr_cache = open_response_cache(kwargs, "qwen_asr")
+            # 可选：方言词表预筛，ASR 文本中命中不少于 lexicon_min_matches 个词表词时跳过阶段二
+            self._lexicon_matcher = load_lexicon_matcher(kwargs)
+            self._lexicon_min_matches = max(1, int(kwargs.get("lexicon_min_matches", 1)))
+            # 可选：常用字表，ASR 文本全部由常用字组成时视为没有方言词
+            self._basic_vocab = load_basic_vocab(kwargs)
             print("Qwen 模型和处理器加载成功！")
         except Exception as e:
             print(f"错误: 加载 Qwen 模型或处理器失败。请检查路径。")
             raise e # 重新抛出异常，让主程序知道失败了
         print("="*50)
 
+    def _pretokenize_extract_template(self):
+        """
+        把阶段二模板拆成 音频占位符之前 / 占位符与 ASR 文本之间 / ASR 文本之后 三段并分别分词。
+        ASR 文本前的空格与文本一起分词，使拼接结果与整句分词一致；用示例文本验证不一致时返回 None。
+        """
+        if self._extract_prefix is None or self._extract_prefix.count(self._audio_token) != 1:
+            return None
+        tokenizer = self.processor.tokenizer
+        head, tail = self._extract_prefix.split(self._audio_token)
+        tail_head = tail.rstrip(" ")
+        lead = tail[len(tail_head):]
+        encode = lambda text: tokenizer(text, add_special_tokens=False)["input_ids"]
+        parts = (encode(head), encode(tail_head), lead, encode(self._extract_suffix))
+
+        probe = "侬今朝夜到去伊屋里厢吃饭"
+        spliced = parts[0] + [self._audio_token_id] + parts[1] + encode(lead + probe) + parts[3]
+        if spliced != encode(self._extract_prefix + probe + self._extract_suffix):
+            print("提示: 阶段二模板分段分词与整句分词结果不一致，不使用预分词")
+            return None
+        return parts
+
+    def _splice_extract_ids(self, asr_texts_: list, counts: list) -> dict:
+        """用预先分词的模板片段拼出阶段二的 input_ids（按每行的音频 token 数展开占位符），左侧补齐"""
+        head_ids, tail_ids, lead, suffix_ids = self._extract_ids
+        mid_ids = self.processor.tokenizer([lead + text for text in asr_texts_], add_special_tokens=False)["input_ids"]
+        rows = [head_ids + [self._audio_token_id] * count + tail_ids + mid + suffix_ids
+                for mid, count in zip(mid_ids, counts)]
+        max_len = max(len(row) for row in rows)
+        pad_id = self.processor.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad_id] * (max_len - len(row)) + row for row in rows], dtype=torch.long)
+        attention_mask = torch.tensor([[0] * (max_len - len(row)) + [1] * len(row) for row in rows], dtype=torch.long)
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
     def process(self, audio_path: str, transcription: str) -> str:
         """
         两阶段流程：
@@ -36,79 +171,320 @@ class QwenAudioModel(MultimodalModel):
         2) 仅基于 asr_text 让模型输出用逗号分隔的方言特有词汇；
         3) 在 asr_text 中使用 mark_words_in_text 标记这些词汇。
         """
-        # try:
-        if not os.path.exists(audio_path):
-            print(f"错误: 音频文件未找到 at {audio_path}")
-            return f"[错误: 音频文件未找到] {transcription}"
+        return self.process_batch([audio_path], [transcription])[0]
+
+    def load_audio(self, audio_path: str):
+        """按处理器要求的采样率加载音频，可在后台线程中预先调用。"""
+        return load_audio(audio_path, self._target_sr)
+
+    def process_tensor(self, audio_path: str, audio_data, transcription: str) -> str:
+        """使用已加载的音频数据执行 process。"""
+        return self.process_batch([audio_path], [transcription], audios=[audio_data])[0]
+
+    def prepare_batch(self, audio_paths: list, audios: list):
+        """
+        在后台线程中预先完成阶段一的处理器调用（特征提取 + 分词），与上一个 batch 的 GPU 推理重叠。
+        有音频未能预加载时返回 None，由 process_batch 自行处理。
+        """
+        if self._engine is not None or not audios or any(audio_data is None for audio_data in audios):
+            return None
+        chunks = self._prepare_chunks([self._asr_text_template] * len(audios), audios)
+        if self._h2d_stream is not None:
+            for chunk in chunks:
+                self._upload_chunk(chunk)
+        return chunks
+
+    def _to_device(self, chunk: dict) -> dict:
+        """异步拷贝一个子 batch 的输入到设备；浮点输入（音频特征）转换为模型的 dtype，整数输入（token id、mask）保持原样"""
+        return {k: (v.to(self.device, dtype=self._dtype, non_blocking=True) if v.is_floating_point()
+                    else v.to(self.device, non_blocking=True)) if torch.is_tensor(v) else v
+                for k, v in chunk.items() if not k.startswith("_")}
+
+    def _upload_chunk(self, chunk: dict):
+        """在 H2D 流上把子 batch 拷贝到显存（原地替换），并记录事件供推理前等待"""
+        with torch.cuda.stream(self._h2d_stream):
+            chunk.update(self._to_device(chunk))
+            event = torch.cuda.Event()
+            event.record(self._h2d_stream)
+        chunk["_h2d_event"] = event
+
+    def process_batch(self, audio_paths: list, transcriptions: list, audios: list = None, prepared=None) -> list:
+        """
+        批量版本的 process：两个阶段各自把整个 batch 拼成一次 generate 调用。
+        audios 中已预加载的音频直接使用，缺失（None）的在这里加载；
+        prepared 为 prepare_batch 预先处理好的阶段一输入。
+        """
+        if audios is None:
+            audios = [None] * len(audio_paths)
+        results = [None] * len(audio_paths)
+        valid = []  # (在 batch 中的下标, 音频路径, 转写文本, 音频数据)
+        for idx, (audio_path, transcription, audio_data) in enumerate(zip(audio_paths, transcriptions, audios)):
+            if audio_data is None and not os.path.exists(audio_path):
+                print(f"错误: 音频文件未找到 at {audio_path}")
+                results[idx] = f"[错误: 音频文件未找到] {transcription}"
+            else:
+                valid.append((idx, audio_path, transcription, audio_data))
+        if not valid:
+            return results
+
+        missing = [audio_path for _, audio_path, _, audio_data in valid if audio_data is None]
+        if len(missing) > 1:
+            # 未预加载的音频并行读取（解码与重采样大多在 C 层完成，会释放 GIL）
+            with ThreadPoolExecutor(max_workers=min(4, len(missing))) as pool:
+                loaded = iter(list(pool.map(self.load_audio, missing)))
+        else:
+            loaded = iter(self.load_audio(audio_path) for audio_path in missing)
+        audios = [audio_data if audio_data is not None else next(loaded)
+                  for _, _, _, audio_data in valid]
 
         # --- 阶段一：ASR 转写 ---
-        asr_conversation = [
-            {"role": "user", "content": "Audio 1: <|audio_bos|><|AUDIO|><|audio_eos|>\n Transcribe the speech to texts"},
-            # {"role": "user", "content": [
-            #     {"type": "audio", "audio_url": audio_path},
-            # ]}
+        if self._engine is None and (prepared is None or len(valid) != len(audio_paths)):
+            prepared = self._prepare_chunks([self._asr_text_template] * len(valid), audios)
+        asr_texts = self._cached_asr(valid, prepared, audios)
+
+        extract_text_templates = []
+        asr_texts_ = []
+        for (_, _, transcription, _), asr_text in zip(valid, asr_texts):
+            if not asr_text:
+                asr_text = transcription or ""
             
-        ]
-        asr_text_template = self.processor.apply_chat_template(asr_conversation, add_generation_prompt=True, tokenize=False)
-        audio_data, _ = librosa.load(audio_path, sr=self.processor.feature_extractor.sampling_rate)
-        asr_inputs = self.processor(text=asr_text_template, audios=[audio_data], return_tensors="pt", padding=True)
-        asr_inputs = asr_inputs.to(self.device)
-        asr_ids = self.model.generate(**asr_inputs, max_length=2048)
-        asr_ids = asr_ids[:, asr_inputs.input_ids.size(1):]
-        asr_text = self.processor.batch_decode(asr_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
-        if not asr_text:
-            asr_text = transcription or ""
-        
-        try:
-            asr_text_ = asr_text.split("'")[1]
-        except:
-            asr_text_ = asr_text
-            print(f"警告: 处理文本时未找到单引号，使用完整文本: {asr_text_}")
-
-        # --- 阶段二：提取方言特有词汇 ---
-        extract_conversation = [
-            {"role": "system", "content": [
-                {"type": "text", "text": f"""Audio 1: <|audio_bos|><|AUDIO|><|audio_eos|>\n {asr_text_} Extract all dialect-specific words from the speech, and separate them with commas. Do not include any other content. \n Example output: \n汾波, 门子\n """},
-            ]},
-            # {"role": "user", "content": [
-            #     {"type": "text", "text": """你三不孜儿地看下停电短信息，是不是门子跳了""" },
-            # ]},
-            # {"role": "assistant", "content": [
-            #     {"type": "text", "text": """三不孜儿地，门子""" + asr_text},
-            # ]},
-            # {"role": "user", "content": [
-            #     {"type": "audio", "audio_url": audio_path},
-            # ]},
-            # {"role": "user", "content": [
-            #     {"type": "text", "text": asr_text },
-            # ]},
-        ]
-        # import pdb; pdb.set_trace()
-        extract_text_template = self.processor.apply_chat_template(extract_conversation, add_generation_prompt=True, tokenize=False)
-        extract_inputs = self.processor(text=extract_text_template, audios=[audio_data], return_tensors="pt", padding=True) #
-        extract_inputs = {k: v.to(self.device) for k, v in extract_inputs.items()}
-        extract_ids = self.model.generate(**extract_inputs, max_length=1024)
-        extract_ids = extract_ids[:, extract_inputs["input_ids"].size(1):]
-        dialect_words_text = self.processor.batch_decode(extract_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
-        print("\n\n\n\nOriginal OUTPUT: \n", asr_text, '\n', asr_text_, '\n', dialect_words_text)
+            try:
+                asr_text_ = asr_text.split("'")[1]
+            except:
+                asr_text_ = asr_text
+                print(f"警告: 处理文本时未找到单引号，使用完整文本: {asr_text_}")
+            asr_texts_.append(asr_text_)
+
+            # --- 阶段二：提取方言特有词汇 ---
+            if self._extract_prefix is not None:
+                extract_text_templates.append(self._extract_prefix + asr_text_ + self._extract_suffix)
+            else:
+                extract_text_templates.append(
+                    self.processor.apply_chat_template(_extract_conversation(asr_text_), add_generation_prompt=True, tokenize=False)
+                )
+        # ASR 文本为空（或全为常用字）的样本不含方言词；词表命中足够多的样本直接使用词表匹配结果；
+        # 只有其余样本才进入阶段二的 generate
+        lexicon_words = [None] * len(valid)
+        for i, asr_text_ in enumerate(asr_texts_):
+            if is_trivial_text(asr_text_, self._basic_vocab):
+                lexicon_words[i] = []
+            elif self._lexicon_matcher is not None:
+                words = self._lexicon_matcher(asr_text_)
+                if len(words) >= self._lexicon_min_matches:
+                    lexicon_words[i] = words
+        residual = [i for i, words in enumerate(lexicon_words) if words is None]
+        if len(residual) == len(valid) and self._engine is None:
+            dialect_words_texts = self._run_generate(
+                self._reuse_audio_features(extract_text_templates, prepared, audios, asr_texts_), max_length=1024
+            )
+        else:
+            # 只有部分样本需要阶段二时，阶段一的子 batch 划分不再适用，为这些样本重新构造输入
+            dialect_words_texts = [None] * len(valid)
+            if residual:
+                residual_texts = self._generate_batch([extract_text_templates[i] for i in residual],
+                                                      [audios[i] for i in residual], max_length=1024)
+                for i, dialect_words_text in zip(residual, residual_texts):
+                    dialect_words_texts[i] = dialect_words_text
+
         # --- 阶段三：标记 ---
-        dialect_words = [w.strip() for w in re.split(r"[,，]", dialect_words_text or "") if w.strip()]
-        marked_text = mark_words_in_text(asr_text_, dialect_words)
-        return marked_text
+        for (idx, _, _, _), asr_text, asr_text_, dialect_words_text, words in zip(
+                valid, asr_texts, asr_texts_, dialect_words_texts, lexicon_words):
+            print("\n\n\n\nOriginal OUTPUT: \n", asr_text, '\n', asr_text_, '\n', dialect_words_text)
+            if words is not None:
+                dialect_words = words
+            else:
+                dialect_words = [w.strip() for w in _SPLIT_RE.split(dialect_words_text or "") if w.strip()]
+            results[idx] = mark_words_in_text(asr_text_, dialect_words)
+        return results
+
+    def _asr_generate(self, prepared: list, audios: list) -> list:
+        """运行阶段一的 generate；使用 vLLM 时直接提交提示词与音频"""
+        if self._engine is not None:
+            return self._vllm_generate([self._asr_text_template] * len(audios), audios, max_length=2048)
+        return self._run_generate(prepared, max_length=2048)
+
+    def _cached_asr(self, valid: list, prepared: list, audios: list) -> list:
+        """
+        运行阶段一的 ASR；启用缓存时以 (模型, 音频内容哈希, 提示词) 为键。
+        整个 batch 都命中时跳过 generate，否则整批重新生成并写入缓存。
+        """
+        if self._asr_cache is None:
+            return self._asr_generate(prepared, audios)
+        keys = []
+        for _, audio_path, _, _ in valid:
+            try:
+                keys.append(make_cache_key(self._model_path, self._asr_text_template, file_sha256(audio_path)))
+            except OSError:
+                keys.append(None)
+        cached = [self._asr_cache.get(key) if key is not None else None for key in keys]
+        if all(text is not None for text in cached):
+            return cached
+        asr_texts = self._asr_generate(prepared, audios)
+        for key, asr_text in zip(keys, asr_texts):
+            if key is not None and asr_text:
+                self._asr_cache.set(key, asr_text)
+        return asr_texts
+
+    def _generate_batch(self, text_templates: list, audios: list, max_length: int) -> list:
+        """将多条 (文本模板, 音频) 合并为批量 generate 调用，返回解码后的文本列表。"""
+        if self._engine is not None:
+            return self._vllm_generate(text_templates, audios, max_length)
+        return self._run_generate(self._prepare_chunks(text_templates, audios), max_length)
 
-        # except Exception as e:
-        #     print(f"处理文件 {os.path.basename(audio_path)} 时发生模型推理错误: {e}")
-        return transcription
+    def _vllm_generate(self, text_templates: list, audios: list, max_length: int) -> list:
+        """用 vLLM 一次提交整个 batch，由其连续批处理调度；贪心解码，与 transformers 默认的 generate 对应"""
+        engine, SamplingParams = self._engine
+        requests = [{"prompt": text_template, "multi_modal_data": {"audio": (audio_data, self._target_sr)}}
+                    for text_template, audio_data in zip(text_templates, audios)]
+        outputs = engine.generate(requests, SamplingParams(max_tokens=max_length, temperature=0.0), use_tqdm=False)
+        return [output.outputs[0].text for output in outputs]
+
+    def _prepare_chunks(self, text_templates: list, audios: list) -> list:
+        """
+        CPU 部分：按 max_batch_size 拆分后分别调用处理器，得到补齐后的各子 batch 输入；
+        GPU 推理时放入锁页内存。
+        """
+        chunks = []
+        for start in range(0, len(text_templates), self.max_batch_size):
+            end = start + self.max_batch_size
+            inputs = self.processor(text=text_templates[start:end], audios=audios[start:end],
+                                    return_tensors="pt", padding=True)
+            chunks.append({k: v.pin_memory() if self._pin_memory and torch.is_tensor(v) else v
+                           for k, v in inputs.items()})
+        return chunks
+
+    def _reuse_audio_features(self, text_templates: list, feature_chunks: list, audios: list, asr_texts_: list = None) -> list:
+        """
+        构造阶段二的输入：只对文本分词，音频特征直接复用阶段一各子 batch 的
+        input_features / feature_attention_mask，省去第二次特征提取。
+
+        新版处理器会把每个音频占位符展开为与音频长度对应的多个 token，
+        这里按阶段一 input_ids 中每行的占位 token 数量做同样的展开，以兼容新旧两种行为。
+        提供 asr_texts_ 且模板已预分词时，只对 ASR 文本分词并与模板片段的 token id 拼接。
+        """
+        if not feature_chunks or "input_features" not in feature_chunks[0]:
+            return self._prepare_chunks(text_templates, audios)
+        chunks = []
+        start = 0
+        for features in feature_chunks:
+            input_ids = features["input_ids"]
+            counts = (input_ids == self._audio_token_id).sum(dim=1).tolist()
+            end = start + len(counts)
+            if self._extract_ids is not None and asr_texts_ is not None:
+                inputs = self._splice_extract_ids(asr_texts_[start:end], counts)
+            else:
+                texts = [template.replace(self._audio_token, self._audio_token * count, 1)
+                         for template, count in zip(text_templates[start:end], counts)]
+                inputs = self.processor.tokenizer(texts, return_tensors="pt", padding=True)
+            start = end
+            chunk = {k: v.pin_memory() if self._pin_memory and torch.is_tensor(v) else v
+                     for k, v in inputs.items()}
+            chunk["input_features"] = features["input_features"]
+            chunk["feature_attention_mask"] = features["feature_attention_mask"]
+            if "audio_embeds" in features:
+                # 阶段一已在设备上得到的音频编码结果，阶段二直接复用
+                chunk["audio_embeds"] = features["audio_embeds"]
+            chunks.append(chunk)
+        return chunks
+
+    def _run_generate(self, chunks: list, max_length: int) -> list:
+        """GPU 部分：逐个子 batch 异步拷贝到设备并调用 generate，返回解码后的文本列表。"""
+        texts = []
+        for chunk in chunks:
+            event = chunk.pop("_h2d_event", None)
+            if event is not None:
+                # 等待 H2D 流上的拷贝完成；这些显存由默认流使用，需告知缓存分配器，避免提前被复用
+                stream = torch.cuda.current_stream()
+                stream.wait_event(event)
+                for v in chunk.values():
+                    if torch.is_tensor(v):
+                        v.record_stream(stream)
+            inputs = self._to_device(chunk)
+            with torch.inference_mode():
+                inputs_embeds = self._embed_inputs(chunk, inputs)
+                if inputs_embeds is not None:
+                    # 只传入 inputs_embeds 时 generate 只返回新生成的 token
+                    generated_ids = self.model.generate(inputs_embeds=inputs_embeds, attention_mask=inputs["attention_mask"],
+                                                        max_length=max_length, use_cache=True)
+                else:
+                    inputs.pop("audio_embeds", None)
+                    generated_ids = self.model.generate(**inputs, max_length=max_length, use_cache=True)
+                    # 左侧补齐后，同一子 batch 内所有样本的输入长度相同，可统一截掉输入部分
+                    generated_ids = generated_ids[:, inputs["input_ids"].size(1):]
+            texts.extend(self.processor.batch_decode(generated_ids, skip_special_tokens=True,
+                                                     clean_up_tokenization_spaces=False))
+        return texts
+
+    def _embed_inputs(self, chunk: dict, inputs: dict):
+        """
+        构造带音频编码结果的 inputs_embeds；音频编码结果缓存在 chunk["audio_embeds"] 中供阶段二复用。
+        仅适用于把音频占位符展开为逐帧 token 的新版处理器；不适用或出错时返回 None，回退为传入 input_features。
+        """
+        if not self._reuse_audio_embeds or "input_features" not in inputs:
+            return None
+        try:
+            audio_embeds = inputs.get("audio_embeds")
+            if audio_embeds is None:
+                audio_embeds = self._encode_audio(inputs["input_features"], inputs["feature_attention_mask"])
+            input_ids = inputs["input_ids"]
+            audio_mask = input_ids == self._audio_token_id
+            if int(audio_mask.sum()) != audio_embeds.shape[0]:
+                # 旧版处理器每个音频只有一个占位 token，由模型内部展开，无法直接替换
+                print("提示: 处理器未按帧展开音频占位符，不复用音频编码结果")
+                self._reuse_audio_embeds = False
+                return None
+            inputs_embeds = self.model.get_input_embeddings()(input_ids)
+            inputs_embeds = inputs_embeds.masked_scatter(audio_mask.unsqueeze(-1).expand_as(inputs_embeds),
+                                                         audio_embeds.to(inputs_embeds.dtype))
+        except Exception as e:
+            print(f"警告: 复用音频编码结果失败，回退为由模型内部编码音频: {e}")
+            self._reuse_audio_embeds = False
+            return None
+        chunk["audio_embeds"] = audio_embeds
+        return inputs_embeds
+
+    def _encode_audio(self, input_features, feature_attention_mask):
+        """运行音频编码器与投影层，返回所有样本有效帧拼接后的音频嵌入 (总帧数, hidden)；与模型 forward 内部的计算一致。"""
+        audio_tower = self.model.audio_tower
+        audio_feat_lengths, audio_output_lengths = audio_tower._get_feat_extract_output_lengths(feature_attention_mask.sum(-1))
+        batch_size, _, max_mel_seq_len = input_features.shape
+        max_seq_len = (max_mel_seq_len - 2) // 2 + 1
+        seq_range = torch.arange(0, max_seq_len, dtype=audio_feat_lengths.dtype,
+                                 device=audio_feat_lengths.device).unsqueeze(0).expand(batch_size, max_seq_len)
+        padding_mask = seq_range >= audio_feat_lengths.unsqueeze(1).expand(batch_size, max_seq_len)
+        padding_mask_ = padding_mask.view(batch_size, 1, 1, max_seq_len).expand(batch_size, 1, max_seq_len, max_seq_len)
+        audio_attention_mask = padding_mask_.to(dtype=audio_tower.conv1.weight.dtype, device=audio_tower.conv1.weight.device)
+        audio_attention_mask[padding_mask_] = float("-inf")
+
+        hidden_states = audio_tower(input_features, attention_mask=audio_attention_mask).last_hidden_state
+        audio_features = self.model.multi_modal_projector(hidden_states)
+        _, max_audio_tokens, _ = audio_features.shape
+        valid = torch.arange(max_audio_tokens, device=audio_output_lengths.device)[None, :] < audio_output_lengths[:, None]
+        return audio_features[valid]
 
     def answer(self, audio_path: str, question: str, options: list, dialect_explanations: str = None) -> str:
         """
         回答问题流程：
         1) 将问题、选项和上下文结合，让模型生成答案。
         """
+        return self.answer_batch(audio_path, [question], [options], dialect_explanations)[0]
+
+    def answer_batch(self, audio_path: str, questions: list, options_list: list, dialect_explanations: str = None) -> list:
+        """
+        同一音频的多个问题只读取并重采样一次音频，再逐题生成答案。
+        """
         if not os.path.exists(audio_path):
             print(f"错误: 音频文件未找到 at {audio_path}")
-            return "E"  # 返回错误标记
+            return ["E"] * len(questions)  # 返回错误标记
+
+        # 加载音频
+        audio_data = self.load_audio(audio_path)
 
+        return [self._answer_with_audio(audio_path, audio_data, question, options, dialect_explanations)
+                for question, options in zip(questions, options_list)]
+
+    def _answer_with_audio(self, audio_path: str, audio_data, question: str, options: list, dialect_explanations: str = None) -> str:
+        """使用已加载的音频数据回答单个问题。"""
         # 构建选项文本
         options_text = "\n".join([option for option in options])
         
@@ -125,9 +501,6 @@ class QwenAudioModel(MultimodalModel):
 
         prompt += "请只输出答案的字母（例如：A），不要输出其他内容。"
 
-        # 加载音频
-        audio_data, _ = librosa.load(audio_path, sr=self.processor.feature_extractor.sampling_rate)
-        
         # 构建对话
         conversation = [
             {"role": "user", "content": [
@@ -138,11 +511,7 @@ class QwenAudioModel(MultimodalModel):
         
         # 生成答案
         text_template = self.processor.apply_chat_template(conversation, add_generation_prompt=True, tokenize=False)
-        inputs = self.processor(text=text_template, audios=[audio_data], return_tensors="pt", padding=True)
-        inputs = inputs.to(self.device)
-        generated_ids = self.model.generate(**inputs, max_length=1024)
-        generated_ids = generated_ids[:, inputs.input_ids.size(1):]
-        answer_text = self.processor.batch_decode(generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
+        answer_text = self._generate_batch([text_template], [audio_data], max_length=1024)[0]
         
         # 从回答中提取答案字母
         if answer_text:
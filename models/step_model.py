@@ -1,24 +1,58 @@
 import os
 import sys
 import re
+import functools
+import logging
+import threading
 from .base_model import MultimodalModel
 import config
 
 # Import utils first before modifying sys.path
 from my_utils.text_processing import mark_words_in_text
+from my_utils.audio_prefetch import existing_paths_in, warm_page_cache
 
-# Store original sys.path
-original_sys_path = sys.path.copy()
+# 逐样本的中间输出走 logging（默认级别 WARNING 下不输出），避免多线程/多进程评估时争用终端
+logger = logging.getLogger("step_model")
+
+# 模型返回的方言词以中英文逗号分隔
+_SPLIT_RE = re.compile(r"[,，]")
+
+
+def _cast_model_dtype(step_model, torch_dtype):
+    """
+    StepAudio2 的构造函数不接受 dtype 参数：构造后把其内部的 torch 模型（llm / model 属性）转换为 torch_dtype。
+    返回转换后模型的实际 dtype；找不到内部模型或其已是该精度时不做转换。
+    """
+    import torch
+    for attr in ("llm", "model"):
+        module = getattr(step_model, attr, None)
+        if isinstance(module, torch.nn.Module):
+            break
+    else:
+        return None
+    current = next(module.parameters()).dtype
+    if current != torch_dtype:
+        module.to(torch_dtype)
+        if getattr(module, "config", None) is not None:
+            module.config.torch_dtype = torch_dtype
+    return torch_dtype
 
-# Add the Step-Audio2 directory to the path
 stepaudio_root_path = config.MODEL_CONFIGS["StepAudioModel"]["stepaudio_root_path"]
-sys.path.append(stepaudio_root_path)
 
-try:
-    from stepaudio2 import StepAudio2
-finally:
-    # Restore original sys.path to avoid affecting other imports
-    sys.path = original_sys_path
+
+@functools.lru_cache(maxsize=1)
+def _get_stepaudio2_cls():
+    """导入 Step-Audio2 仓库中的 StepAudio2 类；只在首次创建模型时导入一次，之后直接返回缓存的类"""
+    # Store original sys.path
+    original_sys_path = sys.path.copy()
+    # Add the Step-Audio2 directory to the path
+    sys.path.append(stepaudio_root_path)
+    try:
+        from stepaudio2 import StepAudio2
+    finally:
+        # Restore original sys.path to avoid affecting other imports
+        sys.path = original_sys_path
+    return StepAudio2
 
 class StepAudioModel(MultimodalModel):
     """
@@ -42,23 +76,53 @@ class StepAudioModel(MultimodalModel):
         print(f"正在加载 Step-Audio-2 模型: '{full_model_path}'...")
         
         try:
+            if not os.path.isdir(full_model_path):
+                raise FileNotFoundError(f"模型目录不存在: {full_model_path}")
             # StepAudio2 库在其内部处理设备分配
-            self.model = StepAudio2(full_model_path)
+            self.model = _get_stepaudio2_cls()(full_model_path)
+            # StepAudio2 共用一份模型与 tokenizer，未说明线程安全：所有 generate 调用经此锁串行执行
+            # （NUM_WORKERS > 1 或 LLM_CONCURRENCY > 1 时可能有多个线程同时调用本模型）
+            self._model_lock = threading.Lock()
+            torch_dtype = kwargs.get("torch_dtype", "bfloat16")
+            self.torch_dtype = None
+            if torch_dtype:
+                import torch
+                self.torch_dtype = _cast_model_dtype(self.model, getattr(torch, torch_dtype))
             # 从 kwargs 获取采样参数，如果没有提供则使用默认值
             self.max_new_tokens = kwargs.get("max_new_tokens", 256)
             self.temperature = kwargs.get("temperature", 0.1)
             self.do_sample = kwargs.get("do_sample", True)
+            # 阶段二是否再次传入音频；默认只用阶段一的识别文本，省去一次完整的音频编码
+            self.reencode_audio_for_extraction = kwargs.get("reencode_audio_for_extraction", False)
+            # answer 只需输出一个选项字母，生成长度无需与 process 相同
+            self.answer_max_new_tokens = kwargs.get("answer_max_new_tokens", 4)
             print("Step-Audio-2 模型加载成功！")
             print(f"已加载以下参数:")
             print(f"  - max_new_tokens: {self.max_new_tokens}")
+            print(f"  - torch_dtype: {self.torch_dtype if self.torch_dtype is not None else '库默认'}")
             print(f"  - temperature: {self.temperature}")
             print(f"  - do_sample: {self.do_sample}")
+            print(f"  - reencode_audio_for_extraction: {self.reencode_audio_for_extraction}")
+            print(f"  - answer_max_new_tokens: {self.answer_max_new_tokens}")
 
         except Exception as e:
             print(f"错误: 加载 Step-Audio-2 模型失败。请检查路径和依赖。")
             raise e
         print("="*50)
 
+    def _generate(self, messages: list, **kwargs):
+        """在锁内调用 self.model，保证同一时刻只有一个线程使用共享的模型与 tokenizer"""
+        with self._model_lock:
+            return self.model(messages, **kwargs)
+
+    def load_audio(self, audio_path: str):
+        """
+        StepAudio2 只接受音频路径并在内部自行解码，无法传入预加载的数组；
+        这里只在后台线程中把文件预读进页缓存，使其与上一个 batch 的推理重叠，仍返回 None。
+        """
+        warm_page_cache(audio_path)
+        return None
+
     def process(self, audio_path: str, transcription: str) -> str:
         """
         两阶段流程：
@@ -67,16 +131,50 @@ class StepAudioModel(MultimodalModel):
         3) 使用 mark_words_in_text 在 asr_text 中标记这些词汇，返回标记后的文本。
         """
         if not os.path.exists(audio_path):
-            print(f"错误: 音频文件未找到 at {audio_path}")
+            logger.warning("错误: 音频文件未找到 at %s", audio_path)
             return f"[错误: 音频文件未找到] {transcription}"
 
+        asr_text, asr_text_ = self._transcribe(audio_path, transcription)
+        dialect_words_text = self._extract_dialect_words(audio_path, asr_text_)
+        logger.debug("Original OUTPUT:\n%s\n%s\n%s", asr_text, asr_text_, dialect_words_text)
+        return self._mark_dialect_words(asr_text_, dialect_words_text)
+
+    def process_batch(self, audio_paths: list, transcriptions: list, audios: list = None) -> list:
+        """
+        批量版本的 process：StepAudio2 每次只处理一段对话，这里逐条调用模型，
+        但按阶段排列：全部样本完成阶段一后再统一进入阶段二，最后逐条标记方言词。
+        """
+        results = [None] * len(audio_paths)
+        valid = []  # (在 batch 中的下标, 音频路径, 转写文本)
+        # 按目录批量检查文件是否存在，代替逐个 os.path.exists
+        existing = existing_paths_in(audio_paths)
+        for idx, (audio_path, transcription) in enumerate(zip(audio_paths, transcriptions)):
+            if audio_path not in existing:
+                logger.warning("错误: 音频文件未找到 at %s", audio_path)
+                results[idx] = f"[错误: 音频文件未找到] {transcription}"
+            else:
+                valid.append((idx, audio_path, transcription))
+        if not valid:
+            return results
+
+        asr_results = [self._transcribe(audio_path, transcription) for _, audio_path, transcription in valid]
+        dialect_words_texts = [self._extract_dialect_words(audio_path, asr_text_)
+                               for (_, audio_path, _), (_, asr_text_) in zip(valid, asr_results)]
+
+        for (idx, _, _), (asr_text, asr_text_), dialect_words_text in zip(valid, asr_results, dialect_words_texts):
+            logger.debug("Original OUTPUT:\n%s\n%s\n%s", asr_text, asr_text_, dialect_words_text)
+            results[idx] = self._mark_dialect_words(asr_text_, dialect_words_text)
+        return results
+
+    def _transcribe(self, audio_path: str, transcription: str):
+        """阶段一：ASR 转写，返回 (模型原始输出, 去掉前缀标记后的识别文本)"""
         # --- 阶段一：ASR 转写 ---
         asr_messages = [
             {"role": "system", "content": "请记录下你所听到的语音内容。"},
             {"role": "human", "content": [{"type": "audio", "audio": audio_path}]},
             {"role": "assistant", "content": None}
         ]
-        tokens, asr_text, _ = self.model(
+        tokens, asr_text, _ = self._generate(
             asr_messages, 
             max_new_tokens=self.max_new_tokens
         )
@@ -85,7 +183,10 @@ class StepAudioModel(MultimodalModel):
         
         if not asr_text:
             asr_text = transcription or ""
+        return asr_text, asr_text_
 
+    def _extract_dialect_words(self, audio_path: str, asr_text_: str) -> str:
+        """阶段二：基于识别文本，让模型输出逗号分隔的方言特有词汇（reencode_audio_for_extraction 为真时同时附上音频）"""
         # --- 阶段二：提取方言特有词汇（逗号分隔）---
         extract_messages = [
             {"role": "system", "content": """对于方言音频以及给定的转写成的文字，找出其中所有的方言特有表达词汇，并用逗号隔开，不用输出其他内容，注意有的方言表达是没有汉字对应的拟声词
@@ -96,23 +197,25 @@ class StepAudioModel(MultimodalModel):
 
 输入："""},
             {"role": "human", "message_type": "text", "content": asr_text_},
-            {"role": "human", "content": [{"type": "audio", "audio": audio_path}]},
             {"role": "assistant", "content": None}
         ]
+        if self.reencode_audio_for_extraction:
+            # 消融用：阶段二再次附上音频（模型需重新编码整段音频）
+            extract_messages.insert(-1, {"role": "human", "content": [{"type": "audio", "audio": audio_path}]})
         
-        tokens, dialect_words_text, _ = self.model(
+        tokens, dialect_words_text, _ = self._generate(
             extract_messages, 
             max_new_tokens=self.max_new_tokens,
             temperature=self.temperature,
             do_sample=self.do_sample
         )
+        return dialect_words_text
 
-        print("\n\n\n\nOriginal OUTPUT: \n", asr_text, '\n', asr_text_, '\n', dialect_words_text)
-
-        # --- 阶段三：在 ASR 文本中标记方言词 ---
-        dialect_words = [w.strip() for w in re.split(r"[,，]", dialect_words_text or "") if w.strip()]
-        marked_text = mark_words_in_text(asr_text_, dialect_words)
-        return marked_text
+    @staticmethod
+    def _mark_dialect_words(asr_text_: str, dialect_words_text: str) -> str:
+        """阶段三：在 ASR 文本中标记方言词"""
+        dialect_words = [w.strip() for w in _SPLIT_RE.split(dialect_words_text or "") if w.strip()]
+        return mark_words_in_text(asr_text_, dialect_words)
 
     def answer(self, audio_path: str, question: str, options: list, dialect_explanations: str = None) -> str:
         """
@@ -120,7 +223,7 @@ class StepAudioModel(MultimodalModel):
         1) 将问题、选项和上下文结合，让模型生成答案。
         """
         if not os.path.exists(audio_path):
-            print(f"错误: 音频文件未找到 at {audio_path}")
+            logger.warning("错误: 音频文件未找到 at %s", audio_path)
             return "E"  # 返回错误标记
 
         # 构建选项文本
@@ -146,12 +249,11 @@ class StepAudioModel(MultimodalModel):
             {"role": "assistant", "content": None}
         ]
         
-        # 生成答案
-        tokens, answer_text, _ = self.model(
+        # 生成答案：只需要一个选项字母，贪心解码少量 token 即可
+        tokens, answer_text, _ = self._generate(
             messages, 
-            max_new_tokens=self.max_new_tokens,
-            temperature=self.temperature,
-            do_sample=self.do_sample
+            max_new_tokens=self.answer_max_new_tokens,
+            do_sample=False
         )
         
         # 从回答中提取答案字母
@@ -0,0 +1,36 @@
+# your_project_folder/my_utils/audio_io.py
+# 音频读取：优先用 soundfile（libsndfile，C 层解码）+ scipy 多相滤波重采样，绕开 librosa/audioread 的慢路径
+
+import math
+
+try:
+    import soundfile as sf
+    from scipy.signal import resample_poly
+except ImportError:
+    sf = None
+    resample_poly = None
+
+
+def load_audio(audio_path: str, target_sr: int):
+    """
+    读取音频并重采样到 target_sr，返回单声道 float32 数组（与 librosa.load(audio_path, sr=target_sr)[0] 对应）。
+
+    soundfile 不支持的格式（如部分 mp3/m4a）或未安装 soundfile/scipy 时回退到 librosa。
+    """
+    if sf is not None:
+        try:
+            data, sr = sf.read(audio_path, dtype="float32", always_2d=False)
+        except RuntimeError:
+            # libsndfile 无法解码该文件，交给 librosa 处理
+            data = None
+        if data is not None:
+            if data.ndim > 1:
+                # 与 librosa 默认的 mono=True 一致：多声道取平均
+                data = data.mean(axis=1)
+            if sr != target_sr:
+                g = math.gcd(int(target_sr), int(sr))
+                data = resample_poly(data, target_sr // g, sr // g)
+            return data.astype("float32", copy=False)
+
+    import librosa
+    return librosa.load(audio_path, sr=target_sr)[0]
@@ -0,0 +1,146 @@
+# your_project_folder/my_utils/audio_prefetch.py
+
+import collections
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def _safe_load(load_audio: Callable, audio_path: str):
+    """在后台线程中加载音频；失败时返回 None，交由模型自行重新读取并报错。"""
+    try:
+        return load_audio(audio_path)
+    except Exception as e:
+        print(f"警告: 预加载音频失败 {audio_path}: {e}")
+        return None
+
+
+def _safe_prepare(prepare_batch: Callable, audio_paths: list, audio_futures: list):
+    """等待本 batch 的音频加载完成后调用 prepare_batch；失败时返回 None，交由模型在推理时重新处理。"""
+    audios = [future.result() for future in audio_futures]
+    try:
+        return audios, prepare_batch(audio_paths, audios)
+    except Exception as e:
+        print(f"警告: 预处理 batch 失败: {e}")
+        return audios, None
+
+
+def iter_prefetched_batches(batches: Iterable[list], load_audio: Callable, num_workers: int = 2,
+                            path_index: int = 4, prepare_batch: Callable = None, prefetch_depth: int = 1
+                            ) -> Iterator[Tuple[list, Optional[List], object]]:
+    """
+    在后台线程中提前加载之后 prefetch_depth 个 batch 的音频，使音频读取与当前 batch 的模型推理重叠。
+
+    Args:
+        batches: 样本 batch 的迭代器，每个样本是一个元组。
+        load_audio: 加载单个音频的函数（通常为 model.load_audio）。
+        num_workers: 后台加载线程数；小于等于 0 时不预加载。
+        path_index: 音频路径在样本元组中的位置。
+        prepare_batch: 可选，prepare_batch(音频路径列表, 音频列表) 在音频加载完成后于另一个后台线程中
+            执行（通常为 model.prepare_batch，如特征提取与分词），其结果随 batch 一起产出。
+        prefetch_depth: 最多提前准备的 batch 数；个别 batch 解码较慢时，更大的值可以避免推理等待。
+
+    Yields:
+        (batch, audios, prepared): audios 与 batch 一一对应；不预加载时 audios 与 prepared 均为 None。
+    """
+    if num_workers <= 0:
+        for batch in batches:
+            yield batch, None, None
+        return
+
+    prepare_pool = ThreadPoolExecutor(max_workers=1) if prepare_batch is not None else None
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            pending = collections.deque()
+            depth = max(1, prefetch_depth)
+            for batch in batches:
+                # 先提交新 batch 的加载（及预处理）任务，在途的 batch 超过 depth 个时再交出最早的一个供模型推理
+                futures = [pool.submit(_safe_load, load_audio, sample[path_index]) for sample in batch]
+                if prepare_pool is not None:
+                    futures = prepare_pool.submit(_safe_prepare, prepare_batch,
+                                                  [sample[path_index] for sample in batch], futures)
+                pending.append((batch, futures))
+                if len(pending) > depth:
+                    yield _collect(*pending.popleft())
+            while pending:
+                yield _collect(*pending.popleft())
+    finally:
+        if prepare_pool is not None:
+            prepare_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _collect(batch: list, futures):
+    """取出一个 batch 的后台任务结果：futures 为音频加载任务列表，或包含预处理的单个任务"""
+    if isinstance(futures, list):
+        return batch, [future.result() for future in futures], None
+    audios, prepared = futures.result()
+    return batch, audios, prepared
+
+
+def warm_page_cache(audio_path: str):
+    """
+    提示操作系统把音频文件预读进页缓存（posix_fadvise WILLNEED），之后模型按路径读取时无需等待磁盘。
+    只适用于只接受音频路径、不接受预加载数组的模型；不支持 posix_fadvise 的平台上直接读一遍文件。
+    """
+    with open(audio_path, 'rb') as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while f.read(1 << 20):
+                pass
+
+
+def walk_audio_paths(audio_base_path: str) -> set:
+    """
+    用 os.scandir 递归遍历音频根目录，一次性收集所有文件的相对路径（os.path.normpath 规范化）。
+
+    之后用集合成员判断代替逐个文件的 os.path.exists，把 N 次 stat 调用换成每个目录一次列目录。
+    符号链接指向的目录照常遍历；按 (st_dev, st_ino) 记录当前目录的祖先目录，链接指回祖先（成环）时跳过，不会无限循环。
+    """
+    paths = set()
+    stack = [(audio_base_path, "", frozenset())]
+    while stack:
+        directory, prefix, ancestors = stack.pop()
+        try:
+            st = os.stat(directory)
+            dir_id = (st.st_dev, st.st_ino)
+            if dir_id in ancestors:
+                continue
+            ancestors = ancestors | {dir_id}
+            with os.scandir(directory) as it:
+                for entry in it:
+                    rel_path = os.path.join(prefix, entry.name) if prefix else entry.name
+                    if entry.is_dir():
+                        stack.append((entry.path, rel_path, ancestors))
+                    else:
+                        paths.add(rel_path)
+        except OSError as e:
+            print(f"警告: 无法遍历目录 {directory}: {e}")
+    return paths
+
+
+@functools.lru_cache(maxsize=256)
+def _list_dir(directory: str, mtime_ns: int) -> frozenset:
+    """目录中的文件名集合；以目录的修改时间为缓存键的一部分，目录内容变化后自动重新列出"""
+    with os.scandir(directory or ".") as it:
+        return frozenset(entry.name for entry in it)
+
+
+def existing_paths_in(paths: Iterable[str]) -> set:
+    """
+    返回 paths 中实际存在的路径：每个不同的父目录只 stat 一次并（按需）列目录，
+    代替对每个文件单独调用 os.path.exists。目录无法列出时回退为逐个 os.path.exists。
+    """
+    by_dir = collections.defaultdict(list)
+    for path in paths:
+        by_dir[os.path.dirname(path)].append(path)
+    existing = set()
+    for directory, dir_paths in by_dir.items():
+        try:
+            names = _list_dir(directory, os.stat(directory or ".").st_mtime_ns)
+        except OSError:
+            existing.update(path for path in dir_paths if os.path.exists(path))
+            continue
+        existing.update(path for path in dir_paths if os.path.basename(path) in names)
+    return existing
@@ -0,0 +1,103 @@
+# your_project_folder/my_utils/lexicon.py
+# 方言词表匹配：在调用大模型提取方言词之前，先用词表在识别文本中查找已知的方言词
+
+import re
+from typing import Callable, List, Tuple
+
+try:
+    # 可选依赖：pyahocorasick，词表很大时一次扫描即可找出所有命中
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_SEPARATOR_RE = re.compile(r"[,，\s]+")
+
+
+def load_lexicon(lexicon_path: str) -> Tuple[str, ...]:
+    """
+    读取方言词表文件：每行一个或多个词（逗号或空白分隔），忽略空行和以 # 开头的注释行。
+
+    Returns:
+        去重后保持原顺序的词元组。
+    """
+    words = {}
+    with open(lexicon_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            for word in _SEPARATOR_RE.split(line):
+                if word:
+                    words[word] = None
+    return tuple(words)
+
+
+def build_lexicon_matcher(words: Tuple[str, ...]) -> Callable[[str], List[str]]:
+    """
+    构建词表匹配函数：match(text) 返回 text 中出现的词表词（按首次出现位置排序，去重）。
+
+    安装了 pyahocorasick 时使用 Aho-Corasick 自动机，否则使用按长度降序的正则交替式。
+    """
+    if not words:
+        return lambda text: []
+
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for word in words:
+            automaton.add_word(word, word)
+        automaton.make_automaton()
+
+        def match(text: str) -> List[str]:
+            # iter 按结束位置产出命中，换算为起始位置后排序
+            hits = sorted((end_idx - len(word) + 1, word) for end_idx, word in automaton.iter(text))
+            return list(dict.fromkeys(word for _, word in hits))
+        return match
+
+    # 长词优先，保证同一位置优先匹配较长的词
+    pattern = re.compile("|".join(map(re.escape, sorted(words, key=len, reverse=True))))
+
+    def match(text: str) -> List[str]:
+        return list(dict.fromkeys(pattern.findall(text)))
+    return match
+
+
+def load_lexicon_matcher(model_kwargs: dict):
+    """
+    根据模型配置中的 dialect_lexicon_path 构建词表匹配函数；未配置或读取失败时返回 None。
+    """
+    lexicon_path = model_kwargs.get("dialect_lexicon_path")
+    if not lexicon_path:
+        return None
+    try:
+        words = load_lexicon(lexicon_path)
+    except OSError as e:
+        print(f"警告: 无法读取方言词表 {lexicon_path}: {e}，将全部交由模型提取方言词。")
+        return None
+    print(f"已加载方言词表: {lexicon_path}（{len(words)} 个词）")
+    return build_lexicon_matcher(words)
+
+
+def load_basic_vocab(model_kwargs: dict):
+    """
+    根据模型配置中的 basic_vocab_path 读取常用字表（文件中的所有非空白字符）；未配置或读取失败时返回 None。
+    """
+    vocab_path = model_kwargs.get("basic_vocab_path")
+    if not vocab_path:
+        return None
+    try:
+        with open(vocab_path, 'r', encoding='utf-8') as f:
+            return frozenset(ch for ch in f.read() if not ch.isspace())
+    except OSError as e:
+        print(f"警告: 无法读取常用字表 {vocab_path}: {e}")
+        return None
+
+
+def is_trivial_text(text: str, basic_vocab=None) -> bool:
+    """
+    判断文本是否无需再让模型提取方言词：文本为空（或只有空白），
+    或者提供了常用字表且文本中的所有文字（忽略标点）都在表中。
+    """
+    if not text or text.isspace():
+        return True
+    if basic_vocab is None:
+        return False
+    return all(ch in basic_vocab for ch in text if ch.isalnum())
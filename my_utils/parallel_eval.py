@@ -0,0 +1,117 @@
+# your_project_folder/my_utils/parallel_eval.py
+# 多进程评估：每块 GPU 一个工作进程、各加载一份模型，主进程按顺序收集结果
+# 工作进程以 spawn 启动，启动时环境中已设置 CUDA_VISIBLE_DEVICES；本模块也不在顶层导入 config/torch
+
+import collections
+import logging
+import logging.handlers
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def _init_worker(gpu, log_queue, log_level):
+    """工作进程初始化：日志记录发回主进程统一输出，子进程之间不争用终端；进程内只有一块可见的 GPU"""
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(log_level)
+    import config
+    # 进程内只有一块可见的 GPU，其编号总是 0
+    if str(config.DEVICE).startswith("cuda"):
+        config.DEVICE = "cuda:0"
+    print(f"[评估进程 {os.getpid()}] 使用 GPU {gpu}")
+
+
+def _start_worker(ctx, gpu, log_queue, log_level) -> ProcessPoolExecutor:
+    """
+    启动绑定到 gpu 的单进程执行器。
+
+    spawn 的子进程在运行 initializer 之前就会重新导入 __main__（进而导入 config 并探测 CUDA），
+    所以 CUDA_VISIBLE_DEVICES 必须在子进程启动时就已在其环境中：这里临时修改主进程的环境变量，
+    提交一个空任务使子进程立即启动，再恢复原值。
+    """
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(gpu, log_queue, log_level))
+    previous = os.environ.get("CUDA_VISIBLE_DEVICES")
+    os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu)
+    try:
+        executor.submit(os.getpid).result()
+    finally:
+        if previous is None:
+            del os.environ["CUDA_VISIBLE_DEVICES"]
+        else:
+            os.environ["CUDA_VISIBLE_DEVICES"] = previous
+    return executor
+
+
+def _process_batch_in_worker(audio_paths: list, transcriptions: list) -> list:
+    """在工作进程中处理一个 batch；模型在首个任务时加载，之后由 get_model_instance 复用"""
+    from my_utils.runner import get_model_instance
+    model = get_model_instance()
+    if model is None:
+        raise RuntimeError(f"评估进程 {os.getpid()} 无法加载模型")
+    return model.process_batch(audio_paths, transcriptions)
+
+
+def _warm_batch(audio_paths: list):
+    """在主进程的后台线程中预读 batch 的音频文件（页缓存在进程间共享），失败时交由工作进程自行读取并报错"""
+    from my_utils.audio_prefetch import warm_page_cache
+    for audio_path in audio_paths:
+        try:
+            warm_page_cache(audio_path)
+        except OSError:
+            pass
+
+
+def run_eval_parallel(batches, gpus: list):
+    """
+    用 len(gpus) 个工作进程（每个绑定一块 GPU）并发处理各 batch，按输入顺序产出 (batch, hyp_texts)。
+
+    batches 中的样本元组与 iter_batches(iter_samples(...)) 相同：下标 3 为纯文本转写，下标 4 为音频路径。
+    同时最多只有 2 * len(gpus) 个 batch 在途，与 iter_process_batches 一样不会一次性读入整个文本文件。
+    提交 batch 时由后台线程预读其音频文件，使磁盘读取与工作进程中前面 batch 的推理重叠。
+    """
+    # 只用 spawn：fork 的子进程继承主进程已初始化的 CUDA 状态；forkserver 的子进程共用服务进程启动时的环境，
+    # 无法为每个进程分别设置 CUDA_VISIBLE_DEVICES
+    ctx = multiprocessing.get_context("spawn")
+    # 子进程的日志记录经队列交给主进程的 handler（未配置时输出到 stderr）
+    root = logging.getLogger()
+    log_queue = ctx.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *(root.handlers or [logging.StreamHandler()]),
+                                              respect_handler_level=True)
+    listener.start()
+
+    executors = []
+    try:
+        for gpu in gpus:
+            executors.append(_start_worker(ctx, gpu, log_queue, root.getEffectiveLevel()))
+        with ThreadPoolExecutor(max_workers=1) as warm_pool:
+            yield from _submit_in_order(executors, warm_pool, batches, 2 * len(gpus))
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        listener.stop()
+
+
+def _submit_in_order(executors, warm_pool, batches, max_pending: int):
+    """
+    提交各 batch 并按输入顺序产出 (batch, hyp_texts)，同时最多 max_pending 个 batch 在途；
+    每个 batch 交给当前在途任务最少的工作进程。
+    """
+    pending = collections.deque()
+    for batch in batches:
+        warm_pool.submit(_warm_batch, [sample[4] for sample in batch])
+        in_flight = [0] * len(executors)
+        for worker, _, future in pending:
+            if not future.done():
+                in_flight[worker] += 1
+        worker = in_flight.index(min(in_flight))
+        future = executors[worker].submit(_process_batch_in_worker,
+                                          [sample[4] for sample in batch], [sample[3] for sample in batch])
+        pending.append((worker, batch, future))
+        if len(pending) >= max_pending:
+            _, done_batch, future = pending.popleft()
+            yield done_batch, future.result()
+    while pending:
+        _, done_batch, future = pending.popleft()
+        yield done_batch, future.result()
@@ -0,0 +1,80 @@
+# your_project_folder/my_utils/response_cache.py
+# 模型/LLM 推理结果的磁盘缓存：重复运行同一实验时命中缓存即可跳过整次推理调用
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+def make_cache_key(*parts) -> str:
+    """将模型名、提示词、音频路径、采样参数等组成部分序列化后取 SHA-256 作为缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache(maxsize=4096)
+def _file_sha256(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """
+    音频文件内容的 SHA-256，用作内容寻址缓存键的一部分（文件改名或移动后仍能命中）。
+    同一进程内按 (路径, 修改时间, 大小) 记忆结果，文件未改动时不重复读取。
+    """
+    st = os.stat(path)
+    return _file_sha256(path, st.st_mtime_ns, st.st_size)
+
+
+class ResponseCache:
+    """
+    基于 SQLite 的键值缓存（键为 make_cache_key 的结果，值为模型返回的文本）。
+    使用 WAL 模式并加锁，可在多个线程间共享同一个实例。
+    """
+
+    def __init__(self, cache_dir: str = ".cache", name: str = "responses"):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{name}.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        """返回缓存的文本；未命中时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_response_cache(model_kwargs: dict, name: str):
+    """
+    根据模型配置中的 enable_cache / cache_dir 打开缓存；未启用或打开失败时返回 None。
+    """
+    if not model_kwargs.get("enable_cache", False):
+        return None
+    cache_dir = model_kwargs.get("cache_dir", ".cache")
+    try:
+        cache = ResponseCache(cache_dir, name)
+    except (OSError, sqlite3.Error) as e:
+        print(f"警告: 无法打开推理结果缓存 ({cache_dir}): {e}，将不使用缓存。")
+        return None
+    print(f"已启用推理结果缓存: {cache.path}")
+    return cache
@@ -0,0 +1,114 @@
+# your_project_folder/my_utils/runner.py
+# 各评估脚本共用的模型加载逻辑
+
+import collections
+import functools
+import importlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 从配置文件导入所有配置
+import config
+
+# 已实例化的模型缓存：模型名 -> 实例，同一进程内重复调用时不再重新加载
+_MODEL_CACHE = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_model_class(model_name: str, module_name: str):
+    """动态地从 models 包中导入对应的模块并取得模型类；结果被缓存，重复调用不再经过导入机制。"""
+    # 例如，如果 model_name 是 "QwenAudioModel"，则导入 models.qwen_model
+    model_module = importlib.import_module(module_name)
+    return getattr(model_module, model_name)
+
+
+def get_model_instance():
+    """动态导入并实例化所选的模型；同一进程内只实例化一次。"""
+    model_name = config.SELECTED_MODEL
+    if model_name in _MODEL_CACHE:
+        return _MODEL_CACHE[model_name]
+
+    try:
+        model_config = config.MODEL_CONFIGS[model_name]
+        ModelClass = _resolve_model_class(model_name, model_config['module_name'])
+        
+        # 实例化模型
+        print(f"正在实例化模型: {model_name}")
+        instance = ModelClass(
+            device=config.DEVICE,
+            **model_config
+        )
+    except (ImportError, KeyError, AttributeError) as e:
+        print(f"错误: 无法加载模型 '{model_name}'。请检查 'config.py' 和 'models' 文件夹。")
+        print(f"详细错误: {e}")
+        return None
+
+    _MODEL_CACHE[model_name] = instance
+    return instance
+
+
+@functools.lru_cache(maxsize=1)
+def load_external_evaluator(evaluator_file: str, class_name: str):
+    """
+    加载外部分段评估器文件并返回其中的评估器类；同一进程内只执行一次该文件。
+
+    Returns:
+        评估器类；无法为该文件创建模块 spec 时返回 None。加载过程中的其他错误直接抛出。
+    """
+    import importlib.util
+    # 将外部工程根目录加入 sys.path，确保其内部引用可解析（如 import power）
+    project_root = os.path.dirname(evaluator_file)
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    # 对 .py 文件，spec_from_file_location 使用 SourceFileLoader，
+    # 它会自动读写 __pycache__ 中的字节码缓存，源文件未修改时不会重新编译
+    spec = importlib.util.spec_from_file_location(
+        "external_evaluator", evaluator_file
+    )
+    if not (spec and spec.loader):
+        return None
+    external_module = importlib.util.module_from_spec(spec)
+    # 先登记到 sys.modules，使外部模块内部（如 dataclass、pickle）可以按模块名找到自身
+    sys.modules["external_evaluator"] = external_module
+    try:
+        spec.loader.exec_module(external_module)
+    except Exception:
+        sys.modules.pop("external_evaluator", None)
+        raise
+    return getattr(external_module, class_name)
+
+
+def _process_one_batch(model, batch, audios, prepared=None):
+    """对一个 batch 调用 model.process_batch；样本元组中下标 3 为纯文本转写，下标 4 为音频路径。"""
+    audio_paths = [sample[4] for sample in batch]
+    transcriptions = [sample[3] for sample in batch]
+    if prepared is not None:
+        # 只有实现了 prepare_batch 的模型才会得到预处理结果
+        return model.process_batch(audio_paths, transcriptions, audios=audios, prepared=prepared)
+    return model.process_batch(audio_paths, transcriptions, audios=audios)
+
+
+def iter_process_batches(model, batches, num_workers: int = 1):
+    """
+    依次对每个 (batch, audios, prepared) 调用模型推理，按输入顺序产出 (batch, hyp_texts)。
+
+    num_workers > 1 时用线程池并发处理多个 batch（适用于远程 API 或会释放 GIL 的推理），
+    同时最多只有 2 * num_workers 个 batch 在途，避免一次性读入整个文本文件。
+    """
+    if num_workers <= 1:
+        for batch, audios, prepared in batches:
+            yield batch, _process_one_batch(model, batch, audios, prepared)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = collections.deque()
+        for batch, audios, prepared in batches:
+            pending.append((batch, executor.submit(_process_one_batch, model, batch, audios, prepared)))
+            if len(pending) >= 2 * num_workers:
+                done_batch, future = pending.popleft()
+                yield done_batch, future.result()
+        while pending:
+            done_batch, future = pending.popleft()
+            yield done_batch, future.result()
@@ -1,5 +1,36 @@
+import os
 import re
-from typing import Tuple, Set, List
+import mmap
+import pickle
+import functools
+import hashlib
+from typing import Iterable, Iterator, Tuple, List
+
+try:
+    # 可选依赖：pyahocorasick，一次扫描即可找出所有待标记词的出现位置
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 预编译的正则：方言词列表中需要去除的符号
+_BRACKET_RE = re.compile(r'[【】{}]')
+# 词汇列表以中英文逗号分隔
+_SPLIT_RE = re.compile(r'[,，]')
+# 去除 GT 中 <> 标记用的转换表，str.translate 比正则替换更快
+_ANGLE_TABLE = str.maketrans('', '', '<>')
+# 待标记词不少于该数量时才构建 Aho-Corasick 自动机；词很少时逐词 str.find 比构建自动机更快
+_AUTOMATON_MIN_WORDS = 8
+
+def find_mark_intervals(transcription: str, dialect_words: List[str]) -> List[Tuple[int, int]]:
+    """
+    找出 mark_words_in_text 会标记的字符区间，不生成带标记的字符串
+    
+    Returns:
+        List[Tuple[int, int]]: 按起始位置排列、互不重叠的 (start, end) 区间
+    """
+    if not dialect_words:
+        return []
+    return _find_word_intervals(transcription, tuple(sorted(set(filter(None, dialect_words)))))
 
 def mark_words_in_text(transcription: str, dialect_words: List[str], left_bracket: str = "【", right_bracket: str = "】") -> str:
     """
@@ -14,18 +45,10 @@ def mark_words_in_text(transcription: str, dialect_words: List[str], left_bracke
     Returns:
         str: 标记后的文本
     """
-    if not dialect_words:
-        return transcription
-    
-    intervals_to_mark = []
-    for word in set(dialect_words):
-        for match in re.finditer(re.escape(word), transcription):
-            intervals_to_mark.append((match.start(), match.end()))
-    
+    intervals_to_mark = find_mark_intervals(transcription, dialect_words)
     if not intervals_to_mark:
         return transcription
     
-    intervals_to_mark.sort()
     new_text_parts = []
     last_pos = 0
     
@@ -37,16 +60,76 @@ def mark_words_in_text(transcription: str, dialect_words: List[str], left_bracke
     new_text_parts.append(transcription[last_pos:])
     return "".join(new_text_parts)
 
+@functools.lru_cache(maxsize=4096)
+def _build_automaton(words: Tuple[str, ...]):
+    """为一组待标记词构建 Aho-Corasick 自动机（同一组词重复出现时直接复用）"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+def _merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """排序并合并相互重叠的区间（首尾相接的区间保持分开），丢弃空区间"""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def _find_word_intervals(text: str, words: Tuple[str, ...]) -> List[Tuple[int, int]]:
+    """
+    找出 text 中所有待标记词的出现区间（同一个词的匹配互不重叠），
+    合并不同词之间相互重叠的区间（如 "门子" 与 "子"）后按起始位置返回。
+    """
+    if not words:
+        return []
+    if ahocorasick is not None and len(words) >= _AUTOMATON_MIN_WORDS:
+        return _automaton_intervals(text, _build_automaton(words))
+    intervals = []
+    for word in words:
+        # 先用 C 层的子串查找排除未出现的词，再逐个定位不重叠的匹配项
+        if word not in text:
+            continue
+        word_len = len(word)
+        idx = text.find(word)
+        while idx >= 0:
+            intervals.append((idx, idx + word_len))
+            idx = text.find(word, idx + word_len)
+    return _merge_intervals(intervals)
+
+def _automaton_intervals(text: str, automaton) -> List[Tuple[int, int]]:
+    """用已构建的自动机单次扫描 text，结果与 _find_word_intervals 的逐词查找一致"""
+    intervals = []
+    last_end = {}
+    # 按结束位置依次得到所有词的命中
+    for end_idx, word in automaton.iter(text):
+        start = end_idx - len(word) + 1
+        # 跳过与该词上一次匹配重叠的命中，与逐词 str.find 的结果一致
+        if start < last_end.get(word, 0):
+            continue
+        last_end[word] = end_idx + 1
+        intervals.append((start, end_idx + 1))
+    return _merge_intervals(intervals)
+
 def process_line_to_ground_truth(line: str, use_word_comparison: bool = False) -> Tuple[str, str, str]:
     parts = line.strip().split('\t')
     if len(parts) != 3:
         print(f"警告: 跳过格式不正确的行: {line.strip()}")
         return "", "", ""
-    filename, transcription, dialect_words_raw = parts
-    
+    return _ground_truth_from_parts(*parts, use_word_comparison)
+
+def _ground_truth_from_parts(filename: str, transcription: str, dialect_words_raw: str,
+                             use_word_comparison: bool = False) -> Tuple[str, str, str]:
+    """由一行的三个字段得到 (文件名, GT文本, GT词汇)；process_line_to_ground_truth 与 iter_ground_truth 共用"""
     if use_word_comparison:
         # 新的比对方法：直接返回词汇列表
-        dialect_words_cleaned = re.sub(r'[【】{}]', '', dialect_words_raw)
+        dialect_words_cleaned = _BRACKET_RE.sub('', dialect_words_raw)
         # dialect_words = [word.strip() for word in dialect_words_cleaned.split(',') if word.strip()]
         # gt_words = ','.join(dialect_words)
         return filename, transcription, dialect_words_cleaned
@@ -57,26 +140,269 @@ def process_line_to_ground_truth(line: str, use_word_comparison: bool = False) -
         # gt_text = mark_words_in_text(transcription, dialect_words)
         return filename, transcription, dialect_words_raw
 
-def _extract_char_indices(text_with_markup: str) -> Set[int]:
-    indices = set()
-    plain_text_pos = 0
-    in_markup = False
-    for char in text_with_markup:
-        if char == '<':
-            in_markup = True
-        elif char == '>':
-            in_markup = False
+@functools.lru_cache(maxsize=65536)
+def parse_line_cached(line: str, use_word_comparison: bool = False) -> Tuple[str, str, str]:
+    """带缓存的 process_line_to_ground_truth：同一进程内重复评估同一文本文件时（如多模型对比）不再重复解析"""
+    return process_line_to_ground_truth(line, use_word_comparison)
+
+def iter_ground_truth(text_file_path: str, use_word_comparison: bool = False) -> Iterator[Tuple[int, Tuple[str, str, str]]]:
+    """
+    一次读入整个文本文件并逐行解析，产出 (该行结束处的字节偏移, (文件名, GT文本, GT词汇))。
+
+    与 iter_text_lines + parse_line_cached 的结果相同，但不逐行经过文件迭代与 lru_cache，
+    适合需要整个文件解析结果的场合（如 load_parsed_lines）。
+    """
+    with open(text_file_path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    raw_lines = data.split(b'\n')
+    last = len(raw_lines) - 1
+    for i, raw_line in enumerate(raw_lines):
+        # 除最后一段外，每行结束处都有被 split 去掉的 '\n'
+        offset += len(raw_line) + (i < last)
+        if not raw_line or raw_line[:1] in b'\r#' or raw_line.isspace():
+            continue
+        line = raw_line.decode('utf-8')
+        parts = line.strip().split('\t')
+        if len(parts) != 3:
+            print(f"警告: 跳过格式不正确的行: {line.strip()}")
+            yield offset, ("", "", "")
+            continue
+        yield offset, _ground_truth_from_parts(*parts, use_word_comparison)
+
+def _find_line_end(f, filename: str):
+    """
+    在文本文件的原始字节中查找第一条文件名为 filename 的行，返回该行结束处的字节偏移。
+
+    用 mmap + bytes.find 在 C 层查找，不逐行解码/解析；找不到时返回 None。
+    """
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # 空文件无法 mmap
+        return None
+    with mm:
+        key = filename.encode('utf-8') + b'\t'
+        # 文件名位于行首：第一行直接比较，其余行查找 "\n文件名\t"
+        line_start = 0 if mm[:len(key)] == key else None
+        search_from = 0
+        while True:
+            if line_start is None:
+                pos = mm.find(b'\n' + key, search_from)
+                if pos < 0:
+                    return None
+                line_start = pos + 1
+            line_end = mm.find(b'\n', line_start)
+            line_end = len(mm) if line_end < 0 else line_end + 1
+            # 确认该行格式正确（三段），与逐行解析时的判断保持一致
+            parts = mm[line_start:line_end].decode('utf-8').strip().split('\t')
+            if len(parts) == 3 and parts[0] == filename:
+                return line_end
+            search_from = line_end - 1
+            line_start = None
+
+def iter_text_lines(text_file_path: str, resume_after: str = None, start_offset: int = 0) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取文本文件（不一次性读入整个文件），跳过空行和以 # 开头的注释行，产出 (该行结束处的字节偏移, 行内容)
+    
+    Args:
+        text_file_path: 文本文件路径
+        resume_after: 若指定，则先跳过文件名等于该值的行及其之前的所有行（用于断点续接）
+        start_offset: 开始读取的字节偏移，用于直接 seek 到上次处理结束的位置
+    """
+    with open(text_file_path, 'rb') as f:
+        if start_offset:
+            f.seek(start_offset)
+        offset = start_offset
+        if resume_after is not None:
+            resume_offset = _find_line_end(f, resume_after)
+            if resume_offset is not None:
+                # 在原始字节中直接定位到该行之后
+                f.seek(resume_offset)
+                offset = resume_offset
+                resume_after = None
+        if resume_after is not None:
+            # 回退：逐行跳过已处理的部分，只比较文件名，不做完整解析
+            for raw_line in f:
+                offset += len(raw_line)
+                parts = raw_line.decode('utf-8').strip().split('\t')
+                if len(parts) == 3 and parts[0] == resume_after:
+                    break
+        for raw_line in f:
+            offset += len(raw_line)
+            # 空行与 # 注释行直接跳过：先看首字节，再用不分配新对象的 isspace 判断
+            if raw_line[:1] in b'\r\n#' or raw_line.isspace():
+                continue
+            yield offset, raw_line.decode('utf-8')
+
+def _parsed_cache_path(text_file_path: str, use_word_comparison: bool, cache_dir: str) -> str:
+    """
+    预解析结果的缓存文件路径（位于 cache_dir/parsed 下，不写入数据集目录）：
+    以文本文件的绝对路径、修改时间和大小为键，文件改动后自动失效。
+    """
+    st = os.stat(text_file_path)
+    path_hash = hashlib.sha256(os.path.abspath(text_file_path).encode('utf-8')).hexdigest()[:16]
+    suffix = '.words' if use_word_comparison else ''
+    name = f"{os.path.basename(text_file_path)}.{path_hash}.{st.st_mtime_ns}.{st.st_size}{suffix}.pkl"
+    return os.path.join(cache_dir, "parsed", name)
+
+def load_parsed_lines(text_file_path: str, use_word_comparison: bool = False,
+                      cache_dir: str = ".cache") -> List[Tuple[int, Tuple[str, str, str]]]:
+    """
+    读取整个文本文件的解析结果 [(该行结束处的字节偏移, (文件名, GT文本, GT词汇)), ...]。
+
+    首次解析（iter_ground_truth）后用 pickle 保存到 cache_dir 下的缓存文件中，之后文件未改动时直接 pickle.load，
+    不再逐行解析；缓存目录不可写时只是不保存缓存。
+    """
+    cache_path = _parsed_cache_path(text_file_path, use_word_comparison, cache_dir)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"警告: 读取解析缓存 {cache_path} 失败，重新解析: {e}")
+
+    parsed = list(iter_ground_truth(text_file_path, use_word_comparison))
+    tmp_path = cache_path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"警告: 无法保存解析缓存 {cache_path}: {e}")
+    return parsed
+
+def iter_parsed_lines(text_file_path: str, use_word_comparison: bool = False, resume_after: str = None,
+                      start_offset: int = 0, use_cache: bool = False,
+                      cache_dir: str = ".cache") -> Iterator[Tuple[int, Tuple[str, str, str]]]:
+    """
+    产出 (该行结束处的字节偏移, (文件名, GT文本, GT词汇))，参数含义与 iter_text_lines 相同。
+
+    use_cache 为 True 时使用 load_parsed_lines 在 cache_dir 下的磁盘缓存，否则流式读取并逐行解析。
+    """
+    if not use_cache:
+        for offset, line in iter_text_lines(text_file_path, resume_after=resume_after, start_offset=start_offset):
+            yield offset, parse_line_cached(line, use_word_comparison)
+        return
+
+    parsed = load_parsed_lines(text_file_path, use_word_comparison, cache_dir)
+    start = 0
+    if start_offset:
+        # 偏移为行结束位置且单调递增：跳过结束位置不超过 start_offset 的行
+        while start < len(parsed) and parsed[start][0] <= start_offset:
+            start += 1
+    elif resume_after is not None:
+        # 找不到该文件名时与 iter_text_lines 一致，不产出任何行
+        start = len(parsed)
+        for i, (_, (filename, _, _)) in enumerate(parsed):
+            if filename == resume_after:
+                start = i + 1
+                break
+    for i in range(start, len(parsed)):
+        yield parsed[i]
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    """将可迭代对象按 batch_size 分组，最后一组可能不足 batch_size"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_samples(parsed_lines, audio_base_path, existing_paths=None):
+    """
+    遍历已解析的文本行并检查音频是否存在，产出 (偏移, 文件名, GT文本, 纯文本转写, 音频路径)。
+    existing_paths 为预先遍历得到的音频相对路径集合；为 None 时逐个调用 os.path.exists。
+    """
+    # 循环外预先计算路径前缀并绑定局部变量，循环内直接字符串拼接，省去每行的 os.path.join 调用
+    base_prefix = os.path.join(audio_base_path, '')
+    path_exists = os.path.exists
+    for offset, (filename, gt_text, _) in parsed_lines:
+        if filename is None or not filename:
+            continue
+        
+        # 与 os.path.join 一致：绝对路径的文件名直接使用
+        is_abs = filename.startswith(os.sep)
+        full_audio_path = filename if is_abs else base_prefix + filename
+        if existing_paths is not None and not is_abs:
+            exists = os.path.normpath(filename) in existing_paths
         else:
-            if in_markup:
-                indices.add(plain_text_pos)
-            plain_text_pos += 1
-    return indices
+            exists = path_exists(full_audio_path)
+        if not exists:
+            print(f"错误: 音频文件未找到 at {full_audio_path}")
+            continue
+        plain_transcription = gt_text.translate(_ANGLE_TABLE)
+        yield offset, filename, gt_text, plain_transcription, full_audio_path
+
+def _extract_char_mask(text_with_markup: str) -> int:
+    """提取被 <> 标记的字符在纯文本中的位置，第 i 位为 1 表示索引 i 被标记"""
+    mask = 0
+    pos = 0
+    plain_text_pos = 0
+    # 用 str.find 在 <> 之间跳转，按区间整段置位
+    while True:
+        lt = text_with_markup.find('<', pos)
+        if lt < 0:
+            break
+        plain_text_pos += (lt - pos) - text_with_markup.count('>', pos, lt)
+        gt = text_with_markup.find('>', lt + 1)
+        end = gt if gt >= 0 else len(text_with_markup)
+        span = (end - lt - 1) - text_with_markup.count('<', lt + 1, end)
+        mask |= ((1 << span) - 1) << plain_text_pos
+        plain_text_pos += span
+        if gt < 0:
+            break
+        pos = gt + 1
+    return mask
+
+@functools.lru_cache(maxsize=None)
+def _gt_char_mask(gt_text: str) -> int:
+    """GT 文本在多次评估（如多模型对比）间不变，缓存其位掩码，每次只需计算 Hyp 一侧"""
+    return _extract_char_mask(gt_text)
 
 def calculate_text_iou(gt_text: str, hyp_text: str) -> float:
-    gt_indices = _extract_char_indices(gt_text)
-    hyp_indices = _extract_char_indices(hyp_text)
-    intersection_size = len(gt_indices.intersection(hyp_indices))
-    union_size = len(gt_indices.union(hyp_indices))
+    gt_has_markup = '<' in gt_text
+    hyp_has_markup = '<' in hyp_text
+    if not gt_has_markup and not hyp_has_markup:
+        return 1.0
+    if not gt_has_markup or not hyp_has_markup:
+        # 交集必为空，只需检查有标记的一侧是否真的标记了字符
+        marked_mask = _gt_char_mask(gt_text) if gt_has_markup else _extract_char_mask(hyp_text)
+        return 0.0 if marked_mask else 1.0
+    gt_mask = _gt_char_mask(gt_text)
+    hyp_mask = _extract_char_mask(hyp_text)
+    intersection_size = (gt_mask & hyp_mask).bit_count()
+    union_size = (gt_mask | hyp_mask).bit_count()
+    if union_size == 0:
+        return 1.0
+    return intersection_size / union_size
+
+def calculate_text_iou_intervals(gt_intervals: List[Tuple[int, int]], hyp_intervals: List[Tuple[int, int]]) -> float:
+    """
+    直接由标记区间（如 find_mark_intervals 的结果）计算 IoU，不必先生成再解析带标记的字符串；
+    两侧区间都应以同一段纯文本为坐标。结果与 calculate_text_iou 对相应标记文本的计算一致。
+    """
+    gt_merged = _merge_intervals(gt_intervals)
+    hyp_merged = _merge_intervals(hyp_intervals)
+    gt_size = sum(end - start for start, end in gt_merged)
+    hyp_size = sum(end - start for start, end in hyp_merged)
+    # 双指针扫描两组有序区间，累加重叠部分的长度
+    intersection_size = 0
+    i = j = 0
+    while i < len(gt_merged) and j < len(hyp_merged):
+        start = max(gt_merged[i][0], hyp_merged[j][0])
+        end = min(gt_merged[i][1], hyp_merged[j][1])
+        if start < end:
+            intersection_size += end - start
+        if gt_merged[i][1] < hyp_merged[j][1]:
+            i += 1
+        else:
+            j += 1
+    union_size = gt_size + hyp_size - intersection_size
     if union_size == 0:
         return 1.0
     return intersection_size / union_size
@@ -92,9 +418,12 @@ def calculate_word_metrics(gt_words: str, hyp_words: str) -> Tuple[float, float,
     Returns:
         Tuple[float, float, float]: (召回率, 准确率, F1分数)
     """
-    # 将逗号分隔的字符串转换为词汇集合
-    gt_word_set = set(word.strip() for word in gt_words.replace(',','，').split('，') if word.strip())
-    hyp_word_set = set(word.strip() for word in hyp_words.split('，') if word.strip())
+    # 将逗号分隔的字符串转换为词汇集合：GT 中英文逗号均可，预测结果只按中文逗号分割（与原有指标口径一致）；空字符串无需分割
+    gt_word_set = {word for word in map(str.strip, _SPLIT_RE.split(gt_words)) if word} if gt_words else set()
+    hyp_word_set = {word for word in map(str.strip, hyp_words.split('，')) if word} if hyp_words else set()
+    if not gt_word_set and not hyp_word_set:
+        # 两侧都没有词汇，视为完全匹配
+        return 1.0, 1.0, 1.0
     
     # 计算交集
     intersection = gt_word_set.intersection(hyp_word_set)